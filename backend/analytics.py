@@ -0,0 +1,238 @@
+"""
+Cross-user analytics
+
+The most applied companies, the application status funnel and the most
+searched roles are computed by aggregation pipelines inside MongoDB and
+stored as small snapshots, so /analytics only reads a few documents.
+The Refresher recomputes the snapshots on a schedule in a daemon thread.
+"""
+import threading
+import time
+
+# application statuses in funnel order, as used by the frontend
+STATUS_LABELS = {"1": "Wish list", "2": "Waiting for referral", "3": "Applied", "4": "Rejected"}
+APPLIED_STATUSES = ("3", "4")
+
+MAX_TIME_MS = 30000  # a pipeline running longer than this is aborted, so a refresh stays bounded
+
+
+def top_companies_pipeline(limit):
+    """
+    Counts applications and applicants per company, spellings merged case insensitively
+
+    :param limit: number of companies to return
+    :return: aggregation pipeline over the users collection
+    """
+    return [
+        {"$unwind": "$applications"},
+        {"$match": {"applications.companyName": {"$nin": [None, ""]}}},
+        # sorted first, so the spelling shown for a company does not depend on storage order
+        {"$sort": {"applications.companyName": 1}},
+        {"$group": {
+            "_id": {"$toLower": "$applications.companyName"},
+            "company": {"$first": "$applications.companyName"},
+            "applications": {"$sum": 1},
+            "users": {"$addToSet": "$_id"},
+        }},
+        {"$project": {"company": 1, "applications": 1, "applicants": {"$size": "$users"}}},
+        {"$sort": {"applications": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+
+
+def open_jobs_pipeline(companies):
+    """
+    Counts the open jobs in the shared pool of the given companies, whatever their spelling
+
+    :param companies: lower-cased company names
+    :return: aggregation pipeline over the shared jobs collection
+    """
+    return [
+        {"$match": {"active": 1}},
+        {"$addFields": {"lc": {"$toLower": "$companyName"}}},
+        {"$match": {"lc": {"$in": companies}}},
+        {"$group": {"_id": "$lc", "openJobs": {"$sum": 1}}},
+    ]
+
+
+def status_funnel_pipeline():
+    """
+    Counts applications and users per application status
+
+    :return: aggregation pipeline over the users collection
+    """
+    return [
+        {"$unwind": "$applications"},
+        {"$group": {"_id": "$applications.status", "count": {"$sum": 1}, "users": {"$addToSet": "$_id"}}},
+        {"$project": {"count": 1, "users": {"$size": "$users"}}},
+    ]
+
+
+def top_searches_pipeline(limit):
+    """
+    Counts the job match analyses per searched role, spellings merged case insensitively
+
+    :param limit: number of roles to return
+    :return: aggregation pipeline over the analyses collection
+    """
+    return [
+        {"$match": {"searchTerm": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": {"$toLower": "$searchTerm"},
+            "role": {"$first": "$searchTerm"},
+            "searches": {"$sum": 1},
+            "users": {"$addToSet": "$userId"},
+        }},
+        {"$project": {"role": 1, "searches": 1, "users": {"$size": "$users"}}},
+        {"$sort": {"searches": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+
+
+def funnel(rows):
+    """
+    Turns the per-status counts into the status funnel
+
+    :param rows: results of status_funnel_pipeline
+    :return: JSON object with the stages in funnel order and the conversion rates
+    """
+    counts = {str(row["_id"]): row for row in rows}
+    total = sum(row["count"] for row in rows)
+    stages = []
+    for status, label in STATUS_LABELS.items():
+        row = counts.get(status, {})
+        count = row.get("count", 0)
+        stages.append({
+            "status": status,
+            "label": label,
+            "applications": count,
+            "users": row.get("users", 0),
+            "share": round(count / total, 4) if total else 0.0,
+        })
+    applied = sum(counts.get(status, {}).get("count", 0) for status in APPLIED_STATUSES)
+    rejected = counts.get("4", {}).get("count", 0)
+    return {
+        "total": total,
+        "stages": stages,
+        # share of tracked applications that were actually sent
+        "appliedRate": round(applied / total, 4) if total else 0.0,
+        # share of sent applications that were rejected
+        "rejectionRate": round(rejected / applied, 4) if applied else 0.0,
+    }
+
+
+def compute(users, shared_jobs, analyses, limit=20):
+    """
+    Runs the analytics pipelines
+
+    :param users: Users document class
+    :param shared_jobs: SharedJobs document class
+    :param analyses: Analyses document class
+    :param limit: number of companies and roles to keep
+    :return: dict of snapshot name -> JSON data
+    """
+    companies = list(users.objects.aggregate(top_companies_pipeline(limit), maxTimeMS=MAX_TIME_MS))
+    lowered = sorted(row["_id"] for row in companies)
+    open_jobs = {
+        row["_id"]: row["openJobs"]
+        for row in shared_jobs.objects.aggregate(open_jobs_pipeline(lowered), maxTimeMS=MAX_TIME_MS)
+    }
+    statuses = list(users.objects.aggregate(status_funnel_pipeline(), maxTimeMS=MAX_TIME_MS))
+    searches = list(analyses.objects.aggregate(top_searches_pipeline(limit), maxTimeMS=MAX_TIME_MS))
+    return {
+        "topCompanies": [
+            {
+                "company": row["company"],
+                "applications": row["applications"],
+                "applicants": row["applicants"],
+                "openJobs": open_jobs.get(row["_id"], 0),
+            }
+            for row in companies
+        ],
+        "statusFunnel": funnel(statuses),
+        "topSearchedRoles": [
+            {"role": row["role"], "searches": row["searches"], "users": row["users"]} for row in searches
+        ],
+    }
+
+
+class Refresher:
+    """
+    Runs a refresh function every interval seconds in a daemon thread
+    """
+
+    def __init__(self, refresh, interval=900):
+        """
+        :param refresh: zero-argument callable recomputing the snapshots
+        :param interval: seconds between runs
+        """
+        self.refresh = refresh
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.last_run = {}
+        self.running = False
+
+    def run_once(self):
+        """
+        Recomputes the snapshots now, unless a refresh is already running
+
+        :return: JSON object with the outcome of the run, or None if it was skipped
+        """
+        with self.lock:
+            if self.running:
+                return None
+            self.running = True
+        return self._run()
+
+    def _run(self):
+        started = time.time()
+        try:
+            self.refresh()
+            result = {"ok": True}
+        except Exception as e:
+            print(f"Error refreshing analytics: {str(e)}")
+            result = {"ok": False, "error": str(e)}
+        result.update(startedAt=started, seconds=round(time.time() - started, 3))
+        with self.lock:
+            self.last_run = result
+            self.running = False
+        return result
+
+    def trigger(self):
+        """
+        Starts a single refresh in a background thread unless one is running
+
+        :return: True if a refresh was started
+        """
+        with self.lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self._run, name="analytics-refresh-once", daemon=True).start()
+        return True
+
+    def start(self):
+        """
+        Refreshes now and then every interval seconds in a daemon thread
+        """
+        def loop():
+            while not self.stopped.is_set():
+                self.run_once()
+                self.stopped.wait(self.interval)
+
+        self.thread = threading.Thread(target=loop, name="analytics-refresh", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        """
+        Returns the outcome of the last run
+
+        :return: JSON object
+        """
+        with self.lock:
+            return dict(self.last_run)
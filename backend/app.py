@@ -4,11 +4,18 @@ The flask application for our program
 # importing required python libraries
 import json
 from datetime import datetime, timedelta
+import functools
 import hashlib
+import time
+import zlib
 import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 import random
-from flask import Flask, jsonify, request, send_file, redirect, url_for, session
+from flask import Flask, Response, jsonify, request, send_file, redirect, url_for, session
 from flask_mongoengine import MongoEngine
+from mongoengine.errors import NotUniqueError
 from flask_cors import CORS, cross_origin
 
 from bs4 import BeautifulSoup
@@ -17,16 +24,52 @@ from fake_useragent import UserAgent
 import pandas as pd
 # from .jobsearch import get_ai_job_recommendations
 from pypdf import PdfReader
-import google.generativeai as genai
 import yaml
 import re
 import requests
+import click
 
 from authlib.integrations.flask_client import OAuth
 from authlib.common.security import generate_token
 
+import analytics
+import llm_batch
+import llm_cache
+import llm_client
+import llm_jobs
+import llm_json
+import llm_ratelimit
+import llm_resilience
+import llm_telemetry
+import local_match
+import prompts
+import reparse
+import resume_parser
+import warmup
+
+# errors from the LLM helpers that are reported to the client instead of a generic 500
+LLM_ERRORS = (
+    llm_client.LLMNotConfiguredError,
+    json.JSONDecodeError,
+    llm_ratelimit.RateLimitedError,
+    llm_resilience.LLMUnavailableError,
+)
+
 # need to add all endpoints to this list in order to place auth checks
-existing_endpoints = ["/applications", "/resume"]
+existing_endpoints = ["/applications", "/resume", "/analyze", "/llm-jobs", "/llm-stats", "/dashboard", "/analytics"]
+
+
+def requires_auth(path):
+    """
+    Checks whether a request path needs an authorization token
+
+    The listed endpoints are protected together with the paths below them,
+    e.g. /llm-jobs/<job_id>.
+
+    :param path: request path
+    :return: bool
+    """
+    return any(path == endpoint or path.startswith(endpoint + "/") for endpoint in existing_endpoints)
 
 user_agent = UserAgent()
 
@@ -39,7 +82,8 @@ def create_app():
     """
     app = Flask(__name__)
     # # make flask support CORS
-    CORS(app)
+    # the frontend runs on another origin and reads the analyses total from this header
+    CORS(app, expose_headers=["X-Total-Count"])
 
 
     with open("application.yml") as f:
@@ -48,12 +92,256 @@ def create_app():
         GOOGLE_CLIENT_ID = info["GOOGLE_CLIENT_ID"]
         GOOGLE_CLIENT_SECRET = info["GOOGLE_CLIENT_SECRET"]
         CONF_URL = info["CONF_URL"]
+        llm_client.configure(info)
+        prompts.configure(info)
+        resume_parser.configure(info)
+        llm_telemetry.reset()
+        CAREER_INSIGHTS_TTL = info.get("CAREER_INSIGHTS_TTL", 24 * 60 * 60)
+        CAREER_INSIGHTS_STALE_TTL = info.get("CAREER_INSIGHTS_STALE_TTL", 7 * 24 * 60 * 60)
+        COMPARISON_TTL = info.get("COMPARISON_TTL", 7 * 24 * 60 * 60)
+        LLM_JOB_WORKERS = info.get("LLM_JOB_WORKERS", 4)
+        LLM_JOB_MAX_PENDING = info.get("LLM_JOB_MAX_PENDING", 100)
+        INSIGHTS_WARMUP_INTERVAL = info.get("INSIGHTS_WARMUP_INTERVAL", 0)
+        INSIGHTS_WARMUP_TOP_N = info.get("INSIGHTS_WARMUP_TOP_N", 50)
+        INSIGHTS_WARMUP_BUDGET = info.get("INSIGHTS_WARMUP_BUDGET", 20)
+        INSIGHTS_BATCH_WINDOW_MS = info.get("INSIGHTS_BATCH_WINDOW_MS", 0)
+        INSIGHTS_BATCH_MAX = info.get("INSIGHTS_BATCH_MAX", 4)
+        LOCAL_MATCH_SKIP_BELOW = info.get("LOCAL_MATCH_SKIP_BELOW", 0)
+        ANALYTICS_REFRESH_INTERVAL = info.get("ANALYTICS_REFRESH_INTERVAL", 0)
 
 
     app.config["CORS_HEADERS"] = "Content-Type"
 
     oauth = OAuth(app)
 
+    # career insights only depend on the job title, so they are shared by every user
+    # expired answers are still served while Gemini is unavailable or rate limited
+    upstream_errors = (llm_resilience.LLMUnavailableError, llm_ratelimit.RateLimitedError)
+    insights_cache = llm_cache.TTLCache(
+        CAREER_INSIGHTS_TTL, stale_ttl=CAREER_INSIGHTS_STALE_TTL, fallback_errors=upstream_errors
+    )
+    # comparisons are keyed by the exact resume and insights, so repeats and retries are free
+    comparison_cache = llm_cache.TTLCache(COMPARISON_TTL, max_entries=4096, fallback_errors=upstream_errors)
+    # runs the independent LLM steps of /analyze side by side
+    llm_pool = ThreadPoolExecutor(max_workers=8)
+    # slow LLM work submitted through /llm-jobs runs here instead of on the request workers
+    llm_job_queue = llm_jobs.JobQueue(workers=LLM_JOB_WORKERS, max_pending=LLM_JOB_MAX_PENDING)
+
+    # optional: distinct titles requested within a few milliseconds share one Gemini call
+    insights_batcher = None
+    if INSIGHTS_BATCH_WINDOW_MS:
+        insights_batcher = llm_batch.MicroBatcher(
+            generate_career_insights_batch,
+            generate_career_insights,
+            window=INSIGHTS_BATCH_WINDOW_MS / 1000.0,
+            max_size=INSIGHTS_BATCH_MAX,
+            key=llm_cache.normalize_key,
+        )
+
+    def insights_key(job_title):
+        return (llm_cache.normalize_key(job_title), prompts.CAREER_INSIGHTS_PROMPT_VERSION)
+
+    # keeps the insights of the most popular job titles warm, see INSIGHTS_WARMUP_* in the readme
+    # every worker process warms its own cache, but the budget is shared by all of them on the host
+    warmup_limiter = None
+    if INSIGHTS_WARMUP_INTERVAL:
+        warmup_limiter = llm_ratelimit.RateLimiter(
+            INSIGHTS_WARMUP_BUDGET * 60.0 / INSIGHTS_WARMUP_INTERVAL,
+            max_in_flight=max(1, INSIGHTS_WARMUP_BUDGET),
+            burst=INSIGHTS_WARMUP_BUDGET,
+            queue_timeout=0,
+            db_path=info.get("GEMINI_LIMITS_DB"),
+            name="insights-warmup",
+        )
+    insights_warmer = warmup.InsightsWarmer(
+        insights_cache,
+        insights_key,
+        lambda job_title: generate_career_insights(job_title),
+        lambda: popular_job_titles(INSIGHTS_WARMUP_TOP_N),
+        interval=INSIGHTS_WARMUP_INTERVAL or 3600,
+        budget=INSIGHTS_WARMUP_BUDGET,
+        stop_errors=upstream_errors + (llm_client.LLMNotConfiguredError,),
+        limiter=warmup_limiter,
+    )
+    if INSIGHTS_WARMUP_INTERVAL:
+        insights_warmer.start()
+
+    # recomputes the cross-user analytics served by /analytics, see ANALYTICS_* in the readme
+    analytics_refresher = analytics.Refresher(
+        lambda: refresh_analytics(info.get("ANALYTICS_TOP_N", 20)),
+        interval=ANALYTICS_REFRESH_INTERVAL or 900,
+    )
+    if ANALYTICS_REFRESH_INTERVAL:
+        analytics_refresher.start()
+
+    def comparison_key(resume, job_insights):
+        # keyed on the compacted prompt, so insights that differ only in
+        # fields the comparison never sees share one answer
+        return llm_cache.fingerprint(
+            prompts.comparison_prompt(resume, job_insights),
+            prompts.COMPARISON_PROMPT_VERSION,
+        )
+
+    def cached_llm_call(endpoint, cache, key, compute):
+        """
+        Looks up an LLM answer in a cache and records answers served from it
+
+        Misses are recorded by the tracked LLM operation itself.
+
+        :param endpoint: name of the LLM operation
+        :param cache: TTLCache holding answers for this operation
+        :param key: cache key
+        :param compute: zero-argument callable producing the answer
+        :return: (answer, cache status) tuple
+        """
+        started = time.monotonic()
+        value, status = cache.get_or_compute(key, compute)
+        if status != "miss":
+            llm_telemetry.record_cached(endpoint, prompts.PROMPT_VERSIONS[endpoint], llm_client.model_name(),
+                                        status, time.monotonic() - started)
+        return value, status
+
+    def get_career_insights(job_title):
+        """
+        Returns the cached career insights for a job title, generating them on a miss
+
+        :param job_title: job title searched by the user
+        :return: (insights, cache status) tuple
+        """
+        def compute():
+            if insights_batcher is not None:
+                return insights_batcher.submit(job_title)
+            return generate_career_insights(job_title)
+
+        return cached_llm_call("career-insights", insights_cache, insights_key(job_title), compute)
+
+    def skips_llm(local):
+        """
+        Checks whether a local match score is too low to be worth a Gemini comparison
+
+        :param local: dict returned by local_match.score()
+        :return: boolean
+        """
+        return local["overallMatch"] < LOCAL_MATCH_SKIP_BELOW
+
+    def get_comparison(resume, job_insights):
+        """
+        Returns the cached comparison of a resume with job insights, generating it on a miss
+
+        Resumes whose local match score is below LOCAL_MATCH_SKIP_BELOW get the
+        local comparison without calling Gemini.
+
+        :param resume: parsed resume dict
+        :param job_insights: career insights dict
+        :return: (comparison, cache status) tuple, the status is "skipped" for local comparisons
+        """
+        local = local_match.score(resume, job_insights)
+        if skips_llm(local):
+            llm_telemetry.record_cached("compare-resume", prompts.COMPARISON_PROMPT_VERSION, llm_client.model_name(),
+                                        "skipped", 0.0)
+            return local_match.as_comparison(local), "skipped"
+        return cached_llm_call(
+            "compare-resume",
+            comparison_cache,
+            comparison_key(resume, job_insights),
+            lambda: compare_resume_to_insights(resume, job_insights),
+        )
+
+    def llm_error_message(err):
+        """
+        Returns the message shown to the client for one of the LLM_ERRORS
+
+        :param err: exception
+        :return: string
+        """
+        if isinstance(err, llm_client.LLMNotConfiguredError):
+            return "GEMINI_API_KEY not set in .env"
+        if isinstance(err, json.JSONDecodeError):
+            return "Gemini response was not valid JSON"
+        return str(err)
+
+    def llm_error_response(err):
+        """
+        Returns the error response for one of the LLM_ERRORS
+
+        :param err: exception
+        :return: JSON object and status code, 429 when rate limited and 503 when
+            Gemini is unavailable, both with Retry-After
+        """
+        response = jsonify({"error": llm_error_message(err)})
+        if isinstance(err, llm_ratelimit.RateLimitedError):
+            response.headers["Retry-After"] = str(err.retry_after)
+            return response, 429
+        if isinstance(err, llm_resilience.LLMUnavailableError):
+            response.headers["Retry-After"] = str(err.retry_after)
+            return response, 503
+        return response, 500
+
+    def stream_llm_json(endpoint, prompt, schema, cache, key, compute, local=None):
+        """
+        Streams a Gemini answer to the client as Server-Sent Events
+
+        Each generated piece of text is sent as a "chunk" event and the final
+        "result" event carries the parsed JSON, which is also cached. A cached
+        answer is sent as a single "result" event. A local match score is sent
+        first as a "local" event; if it is too low, its comparison is the result.
+
+        :param endpoint: name of the LLM operation
+        :param prompt: prompt string
+        :param schema: schema from prompts the answer must match
+        :param cache: TTLCache holding answers for this endpoint
+        :param key: cache key of this prompt
+        :param compute: zero-argument callable used to refresh a stale entry
+        :param local: optional dict returned by local_match.score()
+        :return: text/event-stream response
+        """
+        prompt_version = prompts.PROMPT_VERSIONS[endpoint]
+
+        def events():
+            if local is not None:
+                yield llm_jobs.sse_event("local", local)
+                if skips_llm(local):
+                    llm_telemetry.record_cached(endpoint, prompt_version, llm_client.model_name(), "skipped", 0.0)
+                    yield llm_jobs.sse_event("result", local_match.as_comparison(local))
+                    return
+            started = time.monotonic()
+            cached, fresh = cache.get(key)
+            if cached is not None:
+                if not fresh:
+                    cache.refresh_in_background(key, compute)
+                llm_telemetry.record_cached(endpoint, prompt_version, llm_client.model_name(),
+                                            "hit" if fresh else "stale", time.monotonic() - started)
+                yield llm_jobs.sse_event("result", cached)
+                return
+            try:
+                with llm_telemetry.track(endpoint, prompt_version):
+                    chunks = []
+                    for text in llm_client.get_client().generate_stream(prompt):
+                        chunks.append(text)
+                        yield llm_jobs.sse_event("chunk", {"text": text})
+                    result = parse_llm_json("".join(chunks), schema)
+                cache.set(key, result)
+                yield llm_jobs.sse_event("result", result)
+            except LLM_ERRORS as e:
+                yield llm_jobs.sse_event("error", {"error": llm_error_message(e)})
+            except Exception as e:
+                print(f"Error streaming LLM response: {str(e)}")
+                yield llm_jobs.sse_event("error", {"error": "Internal server error"})
+
+        response = Response(events(), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    def wants_stream():
+        """
+        Checks whether the client asked for a Server-Sent Events response
+
+        :return: boolean
+        """
+        return request.args.get("stream") in ("1", "true") or \
+            "text/event-stream" in request.headers.get("Accept", "")
+
     @app.errorhandler(404)
     def page_not_found():
         """
@@ -83,14 +371,14 @@ def create_app():
         try:
             if request.method == "OPTIONS":
                 return jsonify({"success": "OPTIONS"}), 200
-            if request.path in existing_endpoints:
+            if requires_auth(request.path):
                 headers = request.headers
                 try:
                     token = headers["Authorization"].split(" ")[1]
                 except:
                     return jsonify({"error": "Unauthorized"}), 401
                 userid = token.split(".")[0]
-                user = Users.objects(id=userid).first()
+                user = Users.objects(id=userid).only("authTokens").first()
 
                 if user is None:
                     return jsonify({"error": "Unauthorized"}), 401
@@ -136,6 +424,46 @@ def create_app():
         userid = token.split(".")[0]
         return userid
 
+    def conditional(version_of):
+        """
+        Sends an ETag derived from a version lookup with a GET endpoint, and
+        answers a matching If-None-Match with a 304 without running the endpoint
+
+        :param version_of: zero-argument callable returning the version of the data behind
+            the response, or None if there is none
+        :return: decorator
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    version = version_of()
+                except Exception:
+                    version = None
+                if version is None:
+                    return view(*args, **kwargs)
+                # the query string is part of the tag, e.g. for the pages of /analyses
+                etag = hashlib.sha256(f"{version}:{request.full_path}".encode("utf-8")).hexdigest()[:32]
+                if request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+                    response.set_etag(etag)
+                    return response
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    response.set_etag(etag)
+                return response
+            return wrapper
+        return decorator
+
+    def current_user_version():
+        userid = get_userid_from_header()
+        version = user_version(userid)
+        return None if version is None else f"{userid}.{version}"
+
+    def shared_pool_version():
+        user = current_user_version()
+        return None if user is None else f"{user}.{shared_jobs_version()}"
+
     def delete_auth_token(token_to_delete, user_id):
         """
         Deletes authorization token of the given user from the database
@@ -263,6 +591,7 @@ def create_app():
             return jsonify({"error": "Internal server error"}), 500
 
     @app.route("/getProfile", methods=["GET"])
+    @conditional(current_user_version)
     def get_profile_data():
         """
         Gets user's profile data from the database
@@ -271,18 +600,8 @@ def create_app():
         """
         try:
             userid = get_userid_from_header()
-            user = Users.objects(id=userid).first()
-            profileInformation = {}
-            profileInformation["skills"] = user["skills"]
-            profileInformation["job_levels"] = user["job_levels"]
-            profileInformation["locations"] = user["locations"]
-            profileInformation["institution"] = user["institution"]
-            profileInformation["phone_number"] = user["phone_number"]
-            profileInformation["address"] = user["address"]
-            profileInformation["email"] = user["email"]
-            profileInformation["fullName"] = user["fullName"]
-
-            return jsonify(profileInformation)
+            user = Users.objects(id=userid).only(*PROFILE_FIELDS).first()
+            return jsonify(profile_json(user))
         except:
             return jsonify({"error": "Internal server error"}), 500
 
@@ -290,18 +609,36 @@ def create_app():
     def updateProfilePreferences():
         """
         Update the user profile with preferences: skills, job-level and location
+
+        Only the profile fields listed in PROFILE_FIELDS that actually changed
+        are written, with a single $set; other keys in the body are ignored.
+
+        :return: JSON object with the updated profile
         """
         try:
-            print(request.data)
             userid = get_userid_from_header()
-            user = Users.objects(id=userid).first()
             data = json.loads(request.data)
-            print(user)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Expected a JSON object"}), 400
+            user = Users.objects(id=userid).only(*PROFILE_FIELDS).first()
+            if user is None:
+                return jsonify({"error": "User not found"}), 404
 
-            for key in data.keys():
-                user[key] = data[key]
-            user.save()
-            return jsonify(user.to_json()), 200
+            changes = {}
+            for key, value in data.items():
+                if key not in PROFILE_FIELDS or user[key] == value:
+                    continue
+                if value is not None and not isinstance(value, PROFILE_FIELDS[key]):
+                    return jsonify({"error": f"Invalid value for {key}"}), 400
+                changes[key] = value
+
+            if changes:
+                Users.objects(id=userid).update_one(
+                    inc__version=1, **{f"set__{key}": value for key, value in changes.items()}
+                )
+            profile = profile_json(user)
+            profile.update(changes)
+            return jsonify(profile), 200
 
         except Exception as err:
             print(err)
@@ -420,127 +757,32 @@ def create_app():
             job_title = request.args.get('keywords', '')
             if not job_title:
                 return jsonify({"error": "Job title is required"}), 400
-            
-            api_key = os.getenv('GEMINI_API_KEY')
-            if not api_key:
-                return jsonify({"error": "GEMINI_API_KEY not set in .env"}), 500
-            
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')
 
-            prompt = f"""
-            Create a comprehensive career guide for a {job_title} role. Be specific to this role and provide detailed, practical information.
-            
-            Return a JSON object with the following structure:
-            {{
-                "roleOverview": "Detailed description specific to {job_title}, including day-to-day responsibilities, career progression, and industry impact",
-                
-                "technicalSkills": [
-                    {{
-                        "category": "Core Skills for {job_title}",
-                        "tools": ["List specific tools and technologies required"]
-                    }},
-                    {{
-                        "category": "Additional Technical Skills",
-                        "tools": ["List complementary skills that would be valuable"]
-                    }},
-                    {{
-                        "category": "Emerging Technologies",
-                        "tools": ["List new technologies relevant to this role"]
-                    }}
-                ],
-                
-                "softSkills": [
-                    "List 5-7 soft skills specifically important for {job_title}, with brief explanations"
-                ],
-                
-                "certifications": [
-                    {{
-                        "name": "Certification name specific to {job_title}",
-                        "provider": "Certification provider",
-                        "level": "Difficulty level",
-                        "description": "Why this certification is valuable for {job_title}"
-                    }}
-                ],
-                
-                "projectIdeas": [
-                    {{
-                        "title": "Project name relevant to {job_title}",
-                        "description": "Detailed project description showing relevant skills",
-                        "technologies": ["Required technologies"],
-                        "learningOutcomes": ["What you'll learn from this project"]
-                    }}
-                ],
-                
-                "industryTrends": [
-                    "List 5 current trends specifically affecting {job_title} roles"
-                ],
-                
-                "salaryRange": {{
-                    "entry": "Entry-level salary range for {job_title}",
-                    "mid": "Mid-level salary range for {job_title}",
-                    "senior": "Senior-level salary range for {job_title}",
-                    "factors": ["List factors that affect salary in this role"]
-                }},
-                
-                "learningResources": [
-                    {{
-                        "name": "Resource name specific to {job_title}",
-                        "type": "Course/Book/Tutorial/Workshop",
-                        "cost": "Free/Paid with approximate cost",
-                        "url": "Resource URL",
-                        "duration": "Estimated time to complete",
-                        "description": "What you'll learn from this resource"
-                    }}
-                ],
-                
-                "prerequisites": {{
-                    "education": ["Required/recommended education"],
-                    "experience": ["Required/recommended experience"],
-                    "skills": ["Must-have skills before starting"]
-                }},
-                
-                "careerPath": {{
-                    "entryLevel": "Entry-level positions",
-                    "midLevel": "Mid-level positions",
-                    "senior": "Senior-level positions",
-                    "advancement": ["Possible career advancement paths"]
-                }}
-            }}
-            
-            Ensure all information is:
-            1. Specific to the {job_title} role
-            2. Current and industry-relevant
-            3. Detailed and actionable
-            4. Realistic and practical
-            """
-            
-            #Gemini API call
-            response = model.generate_content(prompt)
-
-            output = response.text
-            output = re.sub(r'```json\n', '', output)
-            output = re.sub(r'```', '', output)
+            if wants_stream():
+                return stream_llm_json(
+                    "career-insights",
+                    prompts.career_insights_prompt(job_title),
+                    prompts.CAREER_INSIGHTS_SCHEMA,
+                    insights_cache,
+                    insights_key(job_title),
+                    lambda: generate_career_insights(job_title),
+                )
 
-            """
-            Use this print statement to debug if the LLM is giving an incorrectly formatted output string
-            """
-            # print(f"The API call has been sent and received: {output}")
-            
-            # Parse the JSON content and return to client
             try:
-                insights = json.loads(output)
-                return jsonify(insights)
-            except:
-                print(f"Error: Gemini response was not valid JSON: {output}")
-                return jsonify({"error": "Gemini response was not valid JSON"}), 500
-            
+                insights, cache_status = get_career_insights(job_title)
+                response = jsonify(insights)
+                response.headers["X-Cache"] = cache_status
+                return response
+            except LLM_ERRORS as e:
+                return llm_error_response(e)
+
         except Exception as e:
             print(f"Error in search: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
-    
+
     # get data from the CSV file for rendering root page
     @app.route("/applications", methods=["GET"])
+    @conditional(current_user_version)
     def get_data():
         """
         Gets user's applications data from the database
@@ -573,7 +815,6 @@ def create_app():
             except:
                 return jsonify({"error": "Missing fields in input"}), 400
 
-            user = Users.objects(id=userid).first()
             current_application = {
                 "id": get_new_application_id(userid),
                 "jobTitle": request_data["jobTitle"],
@@ -583,9 +824,7 @@ def create_app():
                 "location": request_data.get("location"),
                 "status": request_data.get("status", "1"),
             }
-            applications = user["applications"] + [current_application]
-
-            user.update(applications=applications)
+            update_applications(userid, {"$push": {"applications": current_application}}, after=current_application)
 
             try:
                 # Check if job already exists in shared pool (is this logic correct?)
@@ -598,6 +837,7 @@ def create_app():
                 if existing_job:
                     # Increment the appliedBy counter by 1
                     existing_job.update(inc__appliedBy=1)
+                    bump_shared_jobs_version()
                     return jsonify(current_application), 200
                 
                 # Create new shared job
@@ -612,6 +852,7 @@ def create_app():
                     appliedBy=1  # current user is the only one who has applied to the job
                 )
                 new_job.save()
+                bump_shared_jobs_version()
 
                 return jsonify(current_application), 200
                 
@@ -636,27 +877,18 @@ def create_app():
             except:
                 return jsonify({"error": "No fields found in input"}), 400
 
-            user = Users.objects(id=userid).first()
-            current_applications = user["applications"]
-
-            if len(current_applications) == 0:
+            user = Users.objects(id=userid).only("applications").first()
+            if len(user["applications"]) == 0:
                 return jsonify({"error": "No applications found"}), 400
-            else:
-                updated_applications = []
-                app_to_update = None
-                application_updated_flag = False
-                for application in current_applications:
-                    if application["id"] == application_id:
-                        app_to_update = application
-                        application_updated_flag = True
-                        for key, value in request_data.items():
-                            application[key] = value
-                    updated_applications += [application]
-                if not application_updated_flag:
-                    return jsonify({"error": "Application not found"}), 400
-                user.update(applications=updated_applications)
-
-            return jsonify(app_to_update), 200
+
+            def change(application):
+                app_to_update = dict(application, **request_data)
+                return {"$set": {"applications.$": app_to_update}}, app_to_update
+
+            changed = change_application(userid, application_id, change)
+            if changed is None:
+                return jsonify({"error": "Application not found"}), 400
+            return jsonify(changed[1]), 200
         except:
             return jsonify({"error": "Internal server error"}), 500
 
@@ -670,27 +902,29 @@ def create_app():
         """
         try:
             userid = get_userid_from_header()
-            user = Users.objects(id=userid).first()
-
-            current_applications = user["applications"]
-
-            application_deleted_flag = False
-            updated_applications = []
-            app_to_delete = None
-            for application in current_applications:
-                if application["id"] != application_id:
-                    updated_applications += [application]
-                else:
-                    app_to_delete = application
-                    application_deleted_flag = True
-
-            if not application_deleted_flag:
+            changed = change_application(
+                userid, application_id, lambda application: ({"$pull": {"applications": {"id": application_id}}}, None)
+            )
+            if changed is None:
                 return jsonify({"error": "Application not found"}), 400
-            user.update(applications=updated_applications)
-            return jsonify(app_to_delete), 200
+            return jsonify(changed[0]), 200
         except:
             return jsonify({"error": "Internal server error"}), 500
         
+    @app.route("/applications/stats", methods=["GET"])
+    def get_application_stats():
+        """
+        Gets the user's application counts by status, company and ISO week
+
+        :return: JSON object with total, byStatus, byCompany and byWeek
+        """
+        try:
+            userid = get_userid_from_header()
+            return jsonify(application_stats(userid)), 200
+        except Exception as e:
+            print(f"Error getting application stats: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
     @app.route("/wishlist", methods=["POST"])
     def add_application_as_wishlist():
         """
@@ -740,11 +974,11 @@ def create_app():
             }
             
             # Add to user's applications
-            applications = user["applications"] + [current_application]
-            user.update(applications=applications)
+            update_applications(userid, {"$push": {"applications": current_application}}, after=current_application)
             
             # Increment the appliedBy counter in shared job
             shared_job.update(inc__appliedBy=1)
+            bump_shared_jobs_version()
             
             return jsonify(current_application), 200
             
@@ -773,12 +1007,14 @@ def create_app():
                 user.resume.put(file, filename=file.filename,
                                 content_type="application/pdf")
                 user.save()
+                bump_user_version(userid)
                 return jsonify({"message": "resume successfully uploaded"}), 200
             else:
                 # There is a file, we are replacing it
                 user.resume.replace(
                     file, filename=file.filename, content_type="application/pdf")
                 user.save()
+                bump_user_version(userid)
                 return jsonify({"message": "resume successfully replaced"}), 200
         except Exception as e:
             print(e)
@@ -824,54 +1060,16 @@ def create_app():
         try:
             resume_file = request.files['resume']
             print(f"Trying to read the resume!")
-            # Use a PDF parsing library like PyPDF2 or pdfplumber to extract text
-            # For this example, we'll use PyPDF2
-            
-            reader = PdfReader(resume_file)
-            text = ""
+            text = extract_resume_text(resume_file)
             print(f"The resume has been read!")
-            for page in reader.pages:
-                text += page.extract_text()
 
             # Use Gemini to structure the resume content
-            api_key = os.getenv('GEMINI_API_KEY')
-            if not api_key:
-                return jsonify({"error": "GEMINI_API_KEY not set in .env"}), 500
-            
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            
-            prompt = f"""
-            Parse this resume text and extract key information in JSON format. Enter pure JSON without any extra characters or pretty formatting:
-            {text}
-            
-            Return format:
-            {{
-                "skills": ["skill1", "skill2"],
-                "experience": ["exp1", "exp2"],
-                "education": ["edu1", "edu2"],
-                "certifications": ["cert1", "cert2"]
-            }}
-            """
-
-            response = model.generate_content(prompt)
-
-            """
-            Printing the output to see if the LLM answers with any extra characters or formatting to then remove it using RE
-            """
-            # print(f"The API call has been sent and received: {response.text}")
-
-            output = response.text
-            output = re.sub(r'```json\n', '', output)
-            output = re.sub(r'```', '', output)
-
             try:
-                parsed_resume = json.loads(output)
+                parsed_resume = parse_resume_text(text)
                 return jsonify(parsed_resume)
-            
-            except json.JSONDecodeError:
-                print(f"Error: Gemini response was not valid JSON: {output}")
-                return jsonify({"error": "Gemini response was not valid JSON"}), 500
+
+            except LLM_ERRORS as e:
+                return llm_error_response(e)
 
         except Exception as e:
             print(f"Error parsing resume: {str(e)}")
@@ -883,50 +1081,255 @@ def create_app():
             data = request.json
             resume = data['resume']
             job_insights = data['jobInsights']
-            
-            api_key = os.getenv('GEMINI_API_KEY')
-            if not api_key:
-                return jsonify({"error": "GEMINI_API_KEY not set in .env"}), 500
-            
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            
-            prompt = f"""
-            Compare this resume with the job requirements and provide a detailed analysis:
-            Resume: {json.dumps(resume)}
-            Job Requirements: {json.dumps(job_insights)}
-            
-            Return a JSON object with the following structure:
-            {{
-                "overallMatch": percentage,
-                "matchingSkills": ["skill1", "skill2", ...],
-                "missingSkills": ["skill1", "skill2", ...],
-                "recommendations": ["rec1", "rec2", ...]
-            }}
-            """
-            
-            response = model.generate_content(prompt)
-            comparison = response.text
-            comparison = re.sub(r'```json\n', '', comparison)
-            comparison = re.sub(r'```', '', comparison)
-
-            """
-            Use this print statement to debug if the LLM is giving an incorrectly formatted output string
-            """
-            # print(f"The API call has been sent and received: {comparison}")
-            
-            # Parse the JSON content and return to client
+
+            if wants_stream():
+                return stream_llm_json(
+                    "compare-resume",
+                    prompts.comparison_prompt(resume, job_insights),
+                    prompts.COMPARISON_SCHEMA,
+                    comparison_cache,
+                    comparison_key(resume, job_insights),
+                    lambda: compare_resume_to_insights(resume, job_insights),
+                    local=local_match.score(resume, job_insights),
+                )
+
             try:
-                insights = json.loads(comparison)
-                return jsonify(insights)
-            except:
-                print(f"Error: Gemini response was not valid JSON: {comparison}")
-                return jsonify({"error": "Gemini response was not valid JSON"}), 500
+                comparison, cache_status = get_comparison(resume, job_insights)
+                response = jsonify(comparison)
+                response.headers["X-Cache"] = cache_status
+                return response
+            except LLM_ERRORS as e:
+                return llm_error_response(e)
 
         except Exception as e:
             print(f"Error comparing resume: {str(e)}")
             return jsonify({"error": "Failed to compare resume"}), 500
         
+    @app.route("/match-score", methods=["POST"])
+    def match_score():
+        """
+        Scores a parsed resume against job insights locally, without calling Gemini
+
+        The score is available at once, so the UI can show it while the
+        detailed comparison from /compare-resume is still being generated.
+
+        :return: JSON object with overallMatch, matchingSkills and missingSkills
+        """
+        try:
+            data = request.json
+            resume = data['resume']
+            job_insights = data['jobInsights']
+        except Exception:
+            return jsonify({"error": "resume and jobInsights are required"}), 400
+        return jsonify(local_match.score(resume, job_insights)), 200
+
+    def run_analysis(userid, job_title):
+        """
+        Runs the whole job search for a user: parses the stored resume and builds
+        the career insights concurrently, compares them, and saves the analysis
+
+        :param userid: user id of the current active user
+        :param job_title: job title searched by the user
+        :return: JSON object with resume, insights, comparison and the saved analysis
+        :raises llm_client.LLMNotConfiguredError: if GEMINI_API_KEY is not set
+        :raises json.JSONDecodeError: if Gemini does not answer with valid JSON
+        """
+        user = Users.objects(id=userid).only("id", "resume").first()
+        resume_bytes = user.resume.read() if user.resume else None
+
+        insights_future = llm_pool.submit(get_career_insights, job_title)
+        parsed_resume = None
+        if resume_bytes:
+            parsed_resume = parse_resume_text(extract_resume_text(BytesIO(resume_bytes)))
+        insights, _ = insights_future.result()
+
+        if parsed_resume is None:
+            return {
+                "resume": None,
+                "insights": insights,
+                "comparison": None,
+                "analysis": None,
+                "error": "No resume found. Please upload a resume first."
+            }
+
+        comparison, _ = get_comparison(parsed_resume, insights)
+
+        analysis = {
+            "id": new_analysis_id(userid, datetime.now()),
+            "searchTerm": job_title,
+            "date": datetime.now().strftime("%m/%d/%Y, %H:%M:%S"),
+            "comparison": comparison,
+            "insights": insights,
+        }
+        save_user_analysis(userid, analysis)
+        Users.objects(id=userid).update_one(
+            set__parsedResume=parsed_resume,
+            set__parsedResumeAt=datetime.now(),
+            inc__version=1,
+        )
+
+        return {
+            "resume": parsed_resume,
+            "insights": insights,
+            "comparison": comparison,
+            "analysis": analysis
+        }
+
+    @app.route("/analyze", methods=["GET"])
+    def analyze():
+        """
+        Runs the whole job search for the user in one request, see run_analysis
+
+        :return: JSON object with resume, insights, comparison and the saved analysis
+        """
+        try:
+            job_title = request.args.get('keywords', '')
+            if not job_title:
+                return jsonify({"error": "Job title is required"}), 400
+
+            userid = get_userid_from_header()
+            try:
+                return jsonify(run_analysis(userid, job_title)), 200
+            except LLM_ERRORS as e:
+                return llm_error_response(e)
+
+        except Exception as e:
+            print(f"Error in analyze: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
+    def as_llm_job(fn):
+        """
+        Wraps LLM work for the job queue, turning its errors into client messages
+
+        :param fn: zero-argument callable
+        :return: zero-argument callable
+        """
+        def run():
+            try:
+                return fn()
+            except LLM_ERRORS as e:
+                raise llm_jobs.JobError(llm_error_message(e))
+        return run
+
+    @app.route("/llm-jobs", methods=["POST"])
+    def submit_llm_job():
+        """
+        Queues LLM work and returns its job id straight away
+
+        Expected request body: {"kind": "career-insights", "keywords": ...},
+        {"kind": "compare-resume", "resume": ..., "jobInsights": ...} or
+        {"kind": "analyze", "keywords": ...}. Resumes are parsed by sending a
+        multipart form with kind=parse-resume and the resume file.
+
+        :return: JSON object with the job id and where to fetch the result
+        """
+        try:
+            userid = get_userid_from_header()
+            if request.files:
+                data = request.form
+            else:
+                try:
+                    data = json.loads(request.data)
+                except:
+                    return jsonify({"error": "Invalid request format"}), 400
+            kind = data.get("kind")
+
+            if kind in ("career-insights", "analyze"):
+                job_title = data.get("keywords")
+                if not job_title:
+                    return jsonify({"error": "Job title is required"}), 400
+                if kind == "career-insights":
+                    fn = as_llm_job(lambda: get_career_insights(job_title)[0])
+                else:
+                    fn = as_llm_job(lambda: run_analysis(userid, job_title))
+            elif kind == "compare-resume":
+                if "resume" not in data or "jobInsights" not in data:
+                    return jsonify({"error": "Missing fields in input"}), 400
+                resume, job_insights = data["resume"], data["jobInsights"]
+                fn = as_llm_job(lambda: get_comparison(resume, job_insights)[0])
+            elif kind == "parse-resume":
+                if "resume" not in request.files:
+                    return jsonify({"error": "No resume file found in the input"}), 400
+                resume_bytes = request.files["resume"].read()
+                fn = as_llm_job(lambda: parse_resume_text(extract_resume_text(BytesIO(resume_bytes))))
+            else:
+                return jsonify({"error": "Unknown job kind"}), 400
+
+            try:
+                job = llm_job_queue.submit(kind, fn, owner=userid)
+            except llm_jobs.QueueFullError as e:
+                response = jsonify({"error": str(e)})
+                response.headers["Retry-After"] = "5"
+                return response, 503
+
+            return jsonify({
+                "jobId": job.id,
+                "status": job.status,
+                "poll": url_for("get_llm_job", job_id=job.id),
+                "stream": url_for("stream_llm_job", job_id=job.id),
+            }), 202
+        except Exception as e:
+            print(f"Error submitting LLM job: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
+    @app.route("/llm-jobs/stats", methods=["GET"])
+    def get_llm_job_stats():
+        """
+        Returns the depth of the LLM job queue and how long jobs waited
+
+        :return: JSON object
+        """
+        return jsonify(llm_job_queue.stats()), 200
+
+    @app.route("/llm-stats", methods=["GET"])
+    def get_llm_stats():
+        """
+        Returns the LLM call telemetry for tuning caches and limits
+
+        Calls are grouped by endpoint, model and prompt version, each with
+        latency and token histograms, cache status and error counters.
+
+        :return: JSON object
+        """
+        return jsonify({
+            "calls": llm_telemetry.snapshot(),
+            "jsonParsing": llm_json.stats(),
+            "jobs": llm_job_queue.stats(),
+            "warmup": insights_warmer.stats(),
+            "batching": insights_batcher.stats() if insights_batcher is not None else None,
+        }), 200
+
+    @app.route("/llm-jobs/<job_id>", methods=["GET"])
+    def get_llm_job(job_id):
+        """
+        Returns the status of an LLM job, with its result once done
+
+        :param job_id: id returned when the job was submitted
+        :return: JSON object
+        """
+        job = llm_job_queue.get(job_id)
+        # other users' jobs hold their resumes, so they are reported as missing
+        if job is None or job.owner != get_userid_from_header():
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_json()), 200
+
+    @app.route("/llm-jobs/<job_id>/stream", methods=["GET"])
+    def stream_llm_job(job_id):
+        """
+        Streams the status and finally the result of an LLM job as Server-Sent Events
+
+        :param job_id: id returned when the job was submitted
+        :return: text/event-stream response
+        """
+        job = llm_job_queue.get(job_id)
+        # other users' jobs hold their resumes, so they are reported as missing
+        if job is None or job.owner != get_userid_from_header():
+            return jsonify({"error": "Job not found"}), 404
+        response = Response(llm_jobs.stream_job(job), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
     @app.errorhandler(404)
     def page_not_found(error):  # Add error parameter
         """
@@ -937,22 +1340,59 @@ def create_app():
         return jsonify({"error": "Not Found"}), 404
     
     @app.route("/analyses", methods=["GET"])
+    @conditional(current_user_version)
     def get_analyses():
         """
-        Gets user's saved analyses from the database
+        Gets a page of the user's saved analyses, newest first
+
+        Only the list fields are returned unless full=1 is passed; the whole
+        analysis is available from /analyses/<id>. The total number of
+        analyses is sent in the X-Total-Count header.
+
+        :return: JSON list of analyses
         """
         try:
             userid = get_userid_from_header()
-            user = Users.objects(id=userid).first()
-            
-            if not hasattr(user, 'analyses'):
-                return jsonify([])
-                
-            return jsonify(user.analyses)
+            try:
+                page = max(1, int(request.args.get("page", 1)))
+                limit = min(100, max(1, int(request.args.get("limit", 20))))
+            except ValueError:
+                return jsonify({"error": "page and limit must be numbers"}), 400
+            full = request.args.get("full", "").lower() in ("1", "true")
+
+            analyses = Analyses.objects(userId=int(userid)).order_by("-createdAt", "-analysisId")
+            if not full:
+                analyses = analyses.exclude("body")
+            total = analyses.count()
+            page_items = analyses.skip((page - 1) * limit).limit(limit)
+
+            response = jsonify([
+                analysis.to_json() if full else analysis.to_summary() for analysis in page_items
+            ])
+            response.headers["X-Total-Count"] = str(total)
+            return response, 200
         except Exception as e:
             print(f"Error getting analyses: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
 
+    @app.route("/analyses/<int:analysis_id>", methods=["GET"])
+    def get_analysis(analysis_id):
+        """
+        Gets one of the user's saved analyses in full
+
+        :param analysis_id: id of the analysis
+        :return: JSON object
+        """
+        try:
+            userid = get_userid_from_header()
+            analysis = Analyses.objects(userId=int(userid), analysisId=analysis_id).first()
+            if analysis is None:
+                return jsonify({"error": "Analysis not found"}), 404
+            return jsonify(analysis.to_json()), 200
+        except Exception as e:
+            print(f"Error getting analysis: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
     @app.route("/analyses", methods=["POST"]) 
     def save_analysis():
         """
@@ -960,23 +1400,85 @@ def create_app():
         """
         try:
             userid = get_userid_from_header()
-            user = Users.objects(id=userid).first()
-            
-            analysis = json.loads(request.data)
-            
-            if not hasattr(user, 'analyses'):
-                user.analyses = []
-                
-            user.analyses.append(analysis)
-            user.save()
-            
+            try:
+                save_user_analysis(userid, json.loads(request.data))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except NotUniqueError:
+                return jsonify({"error": "An analysis with this id already exists"}), 409
             return jsonify({"message": "Analysis saved successfully"}), 200
         except Exception as e:
             print(f"Error saving analysis: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
         
     
+    @app.route("/dashboard", methods=["GET"])
+    def get_dashboard():
+        """
+        Gets everything the profile page shows in one response: the profile,
+        application counts by status, the latest applications and the latest
+        analyses summaries
+
+        Counts come from the user's application counters and only the latest
+        items are loaded, so the payload does not grow with the user's history.
+
+        :return: JSON object
+        """
+        try:
+            userid = get_userid_from_header()
+            user = Users.objects(id=userid).only(*PROFILE_FIELDS, "applications") \
+                .fields(slice__applications=-DASHBOARD_RECENT_ITEMS).first()
+            if user is None:
+                return jsonify({"error": "User not found"}), 404
+
+            stats = application_stats(user.id)
+            recent_analyses = Analyses.objects(userId=user.id).exclude("body") \
+                .order_by("-createdAt", "-analysisId")
+            return jsonify({
+                "profile": profile_json(user),
+                "applicationCount": stats["total"],
+                "applicationsByStatus": stats["byStatus"],
+                "recentApplications": list(reversed(user.applications)),
+                "analysisCount": recent_analyses.count(),
+                "recentAnalyses": [
+                    analysis.to_summary() for analysis in recent_analyses.limit(DASHBOARD_RECENT_ITEMS)
+                ],
+            }), 200
+        except Exception as e:
+            print(f"Error getting dashboard: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
+    @app.route("/analytics", methods=["GET"])
+    def get_analytics():
+        """
+        Gets the cross-user analytics: most applied companies, the application
+        status funnel and the most searched roles
+
+        The snapshots are materialized on a schedule (ANALYTICS_REFRESH_INTERVAL);
+        if none have been stored yet, a refresh is started in the background.
+
+        :return: JSON object with one entry per snapshot and when it was computed,
+            503 with Retry-After while the first snapshots are computed
+        """
+        try:
+            snapshots = list(AnalyticsSnapshots.objects())
+            if not snapshots:
+                analytics_refresher.trigger()
+                response = jsonify({"error": "Analytics are being computed"})
+                response.headers["Retry-After"] = "5"
+                return response, 503
+            result = {snapshot.name: snapshot.data for snapshot in snapshots}
+            result["computedAt"] = min(snapshot.computedAt for snapshot in snapshots).isoformat()
+            # error messages of failed runs stay in the server log
+            last_run = analytics_refresher.stats()
+            result["refresh"] = {key: last_run[key] for key in ("ok", "startedAt") if key in last_run}
+            return jsonify(result), 200
+        except Exception as e:
+            print(f"Error getting analytics: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
     @app.route("/jobs/shared", methods=["GET"])
+    @conditional(shared_pool_version)
     def get_shared_jobs():
         """
         Gets all shared jobs that the user hasn't applied to yet
@@ -1197,7 +1699,11 @@ class Users(db.Document):
     institution = db.StringField()
     phone_number = db.StringField()
     address = db.StringField()
-    analyses = db.ListField()  # Add analyses field
+    analyses = db.ListField()  # legacy embedded analyses, moved to Analyses by the migrate-analyses command
+    parsedResume = db.DictField()  # structured resume data written by the reparse-resumes command
+    parsedResumeAt = db.DateTimeField()
+    applicationStats = db.DictField()  # application counters kept up to date by the application endpoints
+    version = db.IntField(default=0)  # bumped by every change to the user's data, used for ETags
 
     def to_json(self):
         """
@@ -1207,6 +1713,188 @@ class Users(db.Document):
         """
         return {"id": self.id, "fullName": self.fullName, "username": self.username}
 
+
+# fields returned by /getProfile and editable through /updateProfile, with their JSON type
+PROFILE_FIELDS = {
+    "skills": list,
+    "job_levels": list,
+    "locations": list,
+    "institution": str,
+    "phone_number": str,
+    "address": str,
+    "email": str,
+    "fullName": str,
+}
+
+
+def profile_json(user):
+    """
+    Returns the profile fields of a user
+
+    :param user: Users document, loaded with at least the PROFILE_FIELDS
+    :return: JSON object
+    """
+    return {field: user[field] for field in PROFILE_FIELDS}
+
+
+# number of applications and analyses listed on the dashboard
+DASHBOARD_RECENT_ITEMS = 5
+
+
+def _stats_field(name):
+    # counter names become field names, which cannot contain "." or start with "$"
+    return str(name).replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _stats_name(field):
+    return field.replace("\uff0e", ".").replace("\uff04", "$")
+
+
+def iso_week(date):
+    """
+    Returns the ISO week of an application date
+
+    :param date: date string starting with YYYY-MM-DD
+    :return: week like "2025-W07", or None if the date cannot be read
+    """
+    try:
+        year, week, _ = datetime.strptime(str(date)[:10], "%Y-%m-%d").isocalendar()
+    except ValueError:
+        return None
+    return f"{year}-W{week:02d}"
+
+
+# application fields the counters are derived from
+COUNTED_APPLICATION_FIELDS = ("status", "companyName", "date")
+
+# attempts to change an application before giving up on concurrent edits
+APPLICATION_UPDATE_ATTEMPTS = 5
+
+
+def application_counters(application):
+    """
+    Lists the counters an application is counted in
+
+    :param application: application dict
+    :return: list of dotted field paths in the user document
+    """
+    counters = ["applicationStats.total"]
+    if application.get("status") is not None:
+        counters.append("applicationStats.byStatus." + _stats_field(application["status"]))
+    if application.get("companyName"):
+        counters.append("applicationStats.byCompany." + _stats_field(application["companyName"]))
+    week = iso_week(application.get("date"))
+    if week:
+        counters.append("applicationStats.byWeek." + week)
+    return counters
+
+
+def application_stats_update(before=None, after=None):
+    """
+    Builds the $inc that moves the counters of an application from its old to its new version
+
+    :param before: application before the change, None when it is added
+    :param after: application after the change, None when it is deleted
+    :return: dict of field path -> increment, without zero increments
+    """
+    inc = Counter()
+    for counter in application_counters(before) if before else []:
+        inc[counter] -= 1
+    for counter in application_counters(after) if after else []:
+        inc[counter] += 1
+    return {counter: change for counter, change in inc.items() if change}
+
+
+def update_applications(user_id, update, before=None, after=None, application_id=None):
+    """
+    Changes a user's applications and their counters in one atomic update
+
+    :param user_id: user id
+    :param update: raw update of the applications field, e.g. {"$push": {...}}
+    :param before: application before the change, None when it is added
+    :param after: application after the change, None when it is deleted
+    :param application_id: only update if the user still has this application
+    :return: True if the user document was updated
+
+    The user's version is bumped in the same update. When before is given, the
+    update only applies if the stored application still has the counted values
+    of before, so the counters cannot drift under concurrent edits.
+    """
+    query = {"_id": int(user_id)}
+    if before is not None and application_id is not None:
+        # a missing field matches None, just as application_counters reads it
+        match = {field: before.get(field) for field in COUNTED_APPLICATION_FIELDS}
+        query["applications"] = {"$elemMatch": dict(match, id=application_id)}
+    elif application_id is not None:
+        query["applications.id"] = application_id
+    inc = dict(application_stats_update(before, after), version=1)
+    update = dict(update, **{"$inc": inc})
+    return Users.objects(__raw__=query).update_one(__raw__=update) == 1
+
+
+def change_application(user_id, application_id, change):
+    """
+    Changes one of a user's applications, retrying when a concurrent edit changed it first
+
+    :param user_id: user id
+    :param application_id: application id
+    :param change: callable taking the stored application and returning (raw update, application after the change)
+    :return: (application before, application after), or None if the user has no such application
+    :raises RuntimeError: if the application kept changing under every attempt
+    """
+    for _ in range(APPLICATION_UPDATE_ATTEMPTS):
+        user = Users.objects(id=user_id).only("applications").first()
+        before = next((a for a in user.applications or [] if a["id"] == application_id), None)
+        if before is None:
+            return None
+        update, after = change(before)
+        if update_applications(user_id, update, before=before, after=after, application_id=application_id):
+            return before, after
+    raise RuntimeError(f"Application {application_id} of user {user_id} kept changing")
+
+
+def rebuild_application_stats(user_id):
+    """
+    Recounts a user's application counters from their applications
+
+    :param user_id: user id
+    :return: the stored counters
+    """
+    user = Users.objects(id=user_id).only("applications").first()
+    stats = {"total": 0, "byStatus": {}, "byCompany": {}, "byWeek": {}, "complete": True}
+    for application in user.applications or []:
+        for counter in application_counters(application):
+            path = counter.split(".")[1:]
+            if len(path) == 1:
+                stats[path[0]] += 1
+            else:
+                stats[path[0]][path[1]] = stats[path[0]].get(path[1], 0) + 1
+    # the counters are not part of any versioned response, so the version is left alone
+    Users.objects(id=user_id).update_one(set__applicationStats=stats)
+    return stats
+
+
+def application_stats(user_id):
+    """
+    Returns a user's application counts by status, company and ISO week
+
+    The counters are read from the user document; users whose counters were
+    never built (e.g. from before they existed) are recounted once. Anything
+    that writes applications without update_applications must unset
+    applicationStats, or the counters go stale.
+
+    :param user_id: user id
+    :return: JSON object
+    """
+    user = Users.objects(id=user_id).only("applicationStats").first()
+    stats = user.applicationStats or {}
+    if not stats.get("complete"):
+        stats = rebuild_application_stats(user_id)
+    result = {"total": stats.get("total", 0)}
+    for group in ("byStatus", "byCompany", "byWeek"):
+        result[group] = {_stats_name(name): count for name, count in stats.get(group, {}).items() if count}
+    return result
+
 class SharedJobs(db.Document):
     """
     Shared jobs collection. Contains job postings that can be viewed by all users.
@@ -1221,6 +1909,423 @@ class SharedJobs(db.Document):
     appliedBy = db.IntField(default=1)  # number of people who have applied
     active = db.IntField(default=1) #whether the job is still open or not
 
+class Versions(db.Document):
+    """
+    Version counters of shared data, bumped by every change and used for ETags
+    """
+    name = db.StringField(primary_key=True)  # e.g. sharedJobs
+    value = db.IntField(default=0)
+
+
+SHARED_JOBS_VERSION = "sharedJobs"
+
+
+def bump_shared_jobs_version():
+    """
+    Marks the shared job pool as changed
+    """
+    Versions.objects(name=SHARED_JOBS_VERSION).update_one(upsert=True, inc__value=1)
+
+
+def shared_jobs_version():
+    """
+    Returns the version of the shared job pool
+
+    :return: int
+    """
+    version = Versions.objects(name=SHARED_JOBS_VERSION).first()
+    return version.value if version else 0
+
+
+def bump_user_version(user_id):
+    """
+    Marks a user's data as changed, for changes that cannot bump the version in their own update
+
+    :param user_id: user id
+    """
+    Users.objects(id=user_id).update_one(inc__version=1)
+
+
+def user_version(user_id):
+    """
+    Returns the version of a user's data, loading nothing else
+
+    :param user_id: user id
+    :return: int, or None if there is no such user
+    """
+    user = Users.objects(id=user_id).only("version").first()
+    return (user.version or 0) if user else None
+
+
+class AnalysisParts(db.Document):
+    """
+    Parts of analyses shared between users, e.g. the insights of a job title
+    that came from the same /fake-job response. Each part is stored once,
+    zlib-compressed, under the fingerprint of its canonical JSON. Parts no
+    analysis refers to any more are removed by collect_analysis_parts.
+    """
+    digest = db.StringField(primary_key=True)
+    body = db.BinaryField()
+    createdAt = db.DateTimeField(default=datetime.now)
+
+
+# analysis fields that are stored as shared AnalysisParts instead of in every analysis
+SHARED_ANALYSIS_PARTS = ("insights",)
+
+
+class Analyses(db.Document):
+    """
+    Saved job match analyses, one document per analysis. The user specific
+    part of the analysis is stored zlib-compressed in body, the shared parts
+    are referenced by digest in parts; the other fields serve list views.
+    """
+    userId = db.IntField(required=True)  # owner of the analysis
+    analysisId = db.LongField(required=True)  # id shown to the client (creation time in ms)
+    searchTerm = db.StringField()
+    date = db.StringField()  # display date, "%m/%d/%Y, %H:%M:%S"
+    overallMatch = db.DynamicField()  # copied from the comparison for the list badge
+    createdAt = db.DateTimeField(default=datetime.now)
+    body = db.BinaryField()  # zlib-compressed JSON of the analysis without the shared parts
+    parts = db.DictField()  # field name -> AnalysisParts digest
+
+    meta = {
+        "indexes": [
+            ("userId", "-createdAt"),
+            {"fields": ("userId", "analysisId"), "unique": True},
+        ]
+    }
+
+    def to_summary(self):
+        """
+        Returns the fields needed by the analyses list
+
+        :return: JSON object
+        """
+        return {
+            "id": self.analysisId,
+            "searchTerm": self.searchTerm,
+            "date": self.date,
+            "comparison": {"overallMatch": self.overallMatch},
+        }
+
+    def to_json(self):
+        """
+        Returns the full analysis, with its shared parts filled in
+
+        :return: JSON object
+        """
+        analysis = json.loads(zlib.decompress(self.body))
+        for field, digest in (self.parts or {}).items():
+            analysis[field] = json.loads(load_analysis_part(digest))
+        return analysis
+
+
+def store_analysis_part(part):
+    """
+    Stores a shared analysis part unless an identical one is already stored
+
+    :param part: JSON serializable value
+    :return: digest of the part
+    """
+    canonical = llm_cache.canonical_json(part)
+    digest = llm_cache.fingerprint(canonical)
+    AnalysisParts.objects(digest=digest).update_one(
+        upsert=True,
+        set_on_insert__body=zlib.compress(canonical.encode("utf-8")),
+        set_on_insert__createdAt=datetime.now(),
+    )
+    return digest
+
+
+@functools.lru_cache(maxsize=256)
+def load_analysis_part(digest):
+    """
+    Returns the JSON text of a shared analysis part
+
+    Parts never change once stored, so they are cached by digest.
+
+    :param digest: digest returned by store_analysis_part
+    :return: JSON string
+    """
+    part = AnalysisParts.objects(digest=digest).first()
+    if part is None:
+        raise KeyError(f"Analysis part {digest} not found")
+    return zlib.decompress(part.body).decode("utf-8")
+
+
+# analysis ids are creation times in ms; smaller ids were not made that way
+MIN_ANALYSIS_ID_TIMESTAMP = 946684800000  # 2000-01-01
+
+
+def analysis_created_at(analysis):
+    """
+    Returns when an analysis was made, so migrated and re-posted analyses keep their place in the history
+
+    The id (creation time in ms) is used if it looks like a timestamp, then the
+    display date, and the current time if neither can be read.
+
+    :param analysis: analysis dict
+    :return: datetime
+    """
+    try:
+        analysis_id = int(analysis["id"])
+        if analysis_id >= MIN_ANALYSIS_ID_TIMESTAMP:
+            return datetime.fromtimestamp(analysis_id / 1000)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        pass
+    try:
+        return datetime.strptime(analysis["date"], "%m/%d/%Y, %H:%M:%S")
+    except (KeyError, TypeError, ValueError):
+        return datetime.now()
+
+
+def collect_analysis_parts(min_age=timedelta(hours=1)):
+    """
+    Deletes the shared analysis parts that no analysis refers to any more
+
+    Parts younger than min_age are kept, since an analysis may be about to
+    refer to a part that was just stored.
+
+    :param min_age: timedelta
+    :return: number of parts deleted
+    """
+    referenced = set()
+    for field in SHARED_ANALYSIS_PARTS:
+        referenced.update(Analyses.objects.distinct(f"parts.{field}"))
+    unreferenced = AnalysisParts.objects(createdAt__lt=datetime.now() - min_age).only("digest")
+    unreferenced = [part.digest for part in unreferenced if part.digest not in referenced]
+    if unreferenced:
+        AnalysisParts.objects(digest__in=unreferenced).delete()
+    return len(unreferenced)
+
+
+def new_analysis_id(userid, created_at):
+    """
+    Returns an unused analysis id for a user, the creation time in ms
+
+    :param userid: user id of the owner
+    :param created_at: when the analysis was made
+    :return: int, moved on by a few ms if analyses were made within the same millisecond
+    """
+    analysis_id = int(created_at.timestamp() * 1000)
+    while Analyses.objects(userId=int(userid), analysisId=analysis_id).first():
+        analysis_id += 1
+    return analysis_id
+
+
+def save_user_analysis(userid, analysis):
+    """
+    Stores an analysis in the Analyses collection
+
+    :param userid: user id of the owner
+    :param analysis: analysis dict, as built by /analyze or posted by the client
+    :return: Analyses document
+    :raises ValueError: if the analysis is not a JSON object or its id is not a number
+    :raises NotUniqueError: if the user already has an analysis with this id
+    """
+    if not isinstance(analysis, dict):
+        raise ValueError("An analysis must be a JSON object")
+    analysis = dict(analysis)
+    created_at = analysis_created_at(analysis)
+    if "id" not in analysis:
+        analysis["id"] = new_analysis_id(userid, created_at)
+    try:
+        analysis_id = int(analysis["id"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid analysis id: {analysis['id']!r}")
+    analysis.setdefault("date", datetime.now().strftime("%m/%d/%Y, %H:%M:%S"))
+    parts = {
+        field: store_analysis_part(analysis.pop(field))
+        for field in SHARED_ANALYSIS_PARTS if analysis.get(field) is not None
+    }
+    comparison = analysis.get("comparison") or {}
+    document = Analyses(
+        userId=int(userid),
+        analysisId=analysis_id,
+        searchTerm=analysis.get("searchTerm"),
+        date=analysis["date"],
+        overallMatch=comparison.get("overallMatch") if isinstance(comparison, dict) else None,
+        createdAt=created_at,
+        body=zlib.compress(json.dumps(analysis).encode("utf-8")),
+        parts=parts,
+    )
+    document.save()
+    bump_user_version(userid)
+    return document
+
+
+class AnalyticsSnapshots(db.Document):
+    """
+    Cross-user analytics materialized by refresh_analytics, one document per snapshot
+    """
+    name = db.StringField(primary_key=True)  # e.g. topCompanies, statusFunnel
+    data = db.DynamicField()
+    computedAt = db.DateTimeField()
+    seconds = db.FloatField()  # time the pipelines took
+
+
+def refresh_analytics(limit=20):
+    """
+    Recomputes the cross-user analytics with aggregation pipelines and stores the snapshots
+
+    :param limit: number of companies and roles to keep
+    :return: dict of snapshot name -> JSON data
+    """
+    started = time.monotonic()
+    snapshots = analytics.compute(Users, SharedJobs, Analyses, limit)
+    seconds = round(time.monotonic() - started, 3)
+    computed_at = datetime.now()
+    for name, data in snapshots.items():
+        AnalyticsSnapshots.objects(name=name).update_one(
+            upsert=True, set__data=data, set__computedAt=computed_at, set__seconds=seconds
+        )
+    return snapshots
+
+
+def popular_job_titles(limit):
+    """
+    Returns the job titles users apply to most
+
+    Titles in the shared job pool count once per applicant, titles in the
+    users' own application lists once per application.
+
+    :param limit: number of titles to return
+    :return: list of job titles, most popular first
+    """
+    # spelling variants of a title are merged afterwards, so fetch more than needed
+    shared = SharedJobs.objects(active=1).aggregate([
+        {"$group": {"_id": "$jobTitle", "count": {"$sum": "$appliedBy"}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit * 4},
+    ])
+    applied = Users.objects.aggregate([
+        {"$unwind": "$applications"},
+        {"$group": {"_id": "$applications.jobTitle", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit * 4},
+    ])
+    counts = [(row["_id"], row["count"]) for row in shared] + [(row["_id"], row["count"]) for row in applied]
+    return warmup.top_titles(counts, limit)
+
+
+def parse_llm_json(output, schema=None):
+    """
+    Parses a Gemini answer as JSON
+
+    Code fences, surrounding prose and common syntax slips are repaired
+    locally; only if that fails is Gemini asked once to fix its answer.
+
+    :param output: raw response text
+    :param schema: optional schema from prompts the answer must match
+    :return: parsed JSON
+    :raises json.JSONDecodeError: if no valid answer could be obtained
+    """
+    return llm_json.loads(output, schema, reask=lambda prompt: llm_client.get_client().generate(prompt))
+
+
+def generate_career_insights(job_title):
+    """
+    Uses Gemini to build the career guide for a job title
+
+    :param job_title: job title searched by the user
+    :return: dict with the career insights
+    :raises llm_client.LLMNotConfiguredError: if GEMINI_API_KEY is not set
+    :raises json.JSONDecodeError: if Gemini does not answer with valid JSON
+    """
+    with llm_telemetry.track("career-insights", prompts.CAREER_INSIGHTS_PROMPT_VERSION):
+        return parse_llm_json(
+            llm_client.get_client().generate(prompts.career_insights_prompt(job_title)),
+            prompts.CAREER_INSIGHTS_SCHEMA,
+        )
+
+
+def generate_career_insights_batch(job_titles):
+    """
+    Uses one Gemini call to build the career guides of several job titles
+
+    :param job_titles: list of job titles
+    :return: dict of normalized job title -> insights; titles with a missing
+        or malformed guide are left out
+    :raises llm_client.LLMNotConfiguredError: if GEMINI_API_KEY is not set
+    :raises json.JSONDecodeError: if Gemini does not answer with valid JSON
+    """
+    started = time.monotonic()
+    with llm_telemetry.track("career-insights-batch", prompts.CAREER_INSIGHTS_BATCH_PROMPT_VERSION):
+        answer = parse_llm_json(llm_client.get_client().generate(prompts.career_insights_batch_prompt(job_titles)))
+    seconds = time.monotonic() - started
+    if not isinstance(answer, dict):
+        return {}
+    guides = {llm_cache.normalize_key(title): insights for title, insights in answer.items()}
+    results = {}
+    for job_title in job_titles:
+        key = llm_cache.normalize_key(job_title)
+        try:
+            llm_json.validate(guides.get(key), prompts.CAREER_INSIGHTS_SCHEMA)
+        except json.JSONDecodeError:
+            continue
+        results[key] = guides[key]
+        # career-insights keeps counting every title; the tokens are in the batch series
+        llm_telemetry.record_cached("career-insights", prompts.CAREER_INSIGHTS_PROMPT_VERSION,
+                                    llm_client.model_name(), "batched", seconds)
+    return results
+
+
+def compare_resume_to_insights(resume, job_insights):
+    """
+    Uses Gemini to compare a parsed resume with the career insights of a job
+
+    :param resume: parsed resume dict
+    :param job_insights: career insights dict returned by /fake-job
+    :return: dict with overallMatch, matchingSkills, missingSkills and recommendations
+    :raises llm_client.LLMNotConfiguredError: if GEMINI_API_KEY is not set
+    :raises json.JSONDecodeError: if Gemini does not answer with valid JSON
+    """
+    with llm_telemetry.track("compare-resume", prompts.COMPARISON_PROMPT_VERSION):
+        return parse_llm_json(
+            llm_client.get_client().generate(prompts.comparison_prompt(resume, job_insights)),
+            prompts.COMPARISON_SCHEMA,
+        )
+
+
+def extract_resume_text(resume_file):
+    """
+    Extracts the plain text of a PDF resume
+
+    :param resume_file: file-like object holding the PDF
+    :return: string
+    """
+    reader = PdfReader(resume_file)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def parse_resume_text(text):
+    """
+    Structures the extracted resume text
+
+    Cleanly formatted resumes are parsed locally; Gemini is only used when
+    the local parser's confidence is below RESUME_LOCAL_PARSE_MIN_CONFIDENCE.
+
+    :param text: plain text of the resume
+    :return: dict with skills, experience, education and certifications
+    :raises llm_client.LLMNotConfiguredError: if GEMINI_API_KEY is not set
+    :raises json.JSONDecodeError: if Gemini does not answer with valid JSON
+    """
+    started = time.monotonic()
+    parsed, confidence = resume_parser.parse(text)
+    if confidence >= resume_parser.min_confidence():
+        llm_telemetry.record_cached("parse-resume", prompts.RESUME_PARSE_PROMPT_VERSION, "local-parser", "local",
+                                    time.monotonic() - started)
+        return parsed
+    with llm_telemetry.track("parse-resume", prompts.RESUME_PARSE_PROMPT_VERSION):
+        return parse_llm_json(
+            llm_client.get_client().generate(prompts.resume_parse_prompt(text)),
+            prompts.RESUME_PARSE_SCHEMA,
+        )
+
+
 def get_new_user_id():
     """
     Returns the next value to be used for new user
@@ -1256,5 +2361,96 @@ def get_new_application_id(user_id):
 
     return new_id + 1
 
+@app.cli.command("reparse-resumes")
+@click.option("--workers", default=8, show_default=True, help="Resumes extracted and parsed in parallel")
+@click.option("--llm-concurrency", default=4, show_default=True, help="Maximum Gemini calls in flight")
+@click.option("--checkpoint", default="reparse_checkpoint.txt", show_default=True,
+              help="File recording the users that are already done")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint and parse every resume again")
+def reparse_resumes_command(workers, llm_concurrency, checkpoint, restart):
+    """
+    Re-extracts and re-parses every stored resume, e.g. after the parse prompt changed
+    """
+    try:
+        llm_client.get_client()
+    except llm_client.LLMNotConfiguredError as e:
+        raise click.ClickException(str(e))
+
+    def save(user_id, parsed_resume):
+        Users.objects(id=user_id).update_one(
+            set__parsedResume=parsed_resume, set__parsedResumeAt=datetime.now(), inc__version=1
+        )
+
+    users = Users.objects(resume__ne=None).only("id", "resume").order_by("id").no_cache()
+    stats = reparse.run(
+        users,
+        extract=extract_resume_text,
+        parse=parse_resume_text,
+        save=save,
+        checkpoint_path=checkpoint,
+        workers=workers,
+        llm_concurrency=llm_concurrency,
+        restart=restart,
+        report=click.echo,
+    )
+    click.echo(stats.summary())
+
+
+@app.cli.command("migrate-analyses")
+def migrate_analyses_command():
+    """
+    Moves analyses still embedded in the user documents to the Analyses collection
+    """
+    moved = skipped = 0
+    for user in Users.objects(analyses__0__exists=True).only("id", "analyses").no_cache():
+        # analyses that cannot be moved stay embedded, so nothing is lost
+        kept = []
+        for analysis in user.analyses:
+            try:
+                save_user_analysis(user.id, analysis)
+                moved += 1
+            except NotUniqueError:
+                pass  # moved by an earlier, interrupted run
+            except ValueError as e:
+                click.echo(f"Skipping an analysis of user {user.id}: {str(e)}")
+                kept.append(analysis)
+                skipped += 1
+        Users.objects(id=user.id).update_one(set__analyses=kept, inc__version=1)
+    click.echo(f"Moved {moved} analyses, skipped {skipped}")
+
+
+@app.cli.command("collect-analysis-parts")
+@click.option("--min-age-minutes", default=60, show_default=True,
+              help="Keep unreferenced parts younger than this, they may be in use by an analysis being saved")
+def collect_analysis_parts_command(min_age_minutes):
+    """
+    Deletes the shared analysis parts that no analysis refers to any more
+    """
+    deleted = collect_analysis_parts(timedelta(minutes=min_age_minutes))
+    click.echo(f"Deleted {deleted} unreferenced analysis parts")
+
+
+@app.cli.command("rebuild-application-stats")
+def rebuild_application_stats_command():
+    """
+    Recounts every user's application counters from their applications
+    """
+    users = 0
+    for user in Users.objects.only("id").no_cache():
+        rebuild_application_stats(user.id)
+        users += 1
+    click.echo(f"Rebuilt application stats for {users} users")
+
+
+@app.cli.command("refresh-analytics")
+@click.option("--limit", default=20, show_default=True, help="Companies and roles to keep")
+def refresh_analytics_command(limit):
+    """
+    Recomputes the cross-user analytics served by /analytics, e.g. from cron
+    """
+    snapshots = refresh_analytics(limit)
+    click.echo(f"Refreshed {', '.join(sorted(snapshots))}")
+
+
 if __name__ == "__main__":
     app.run(host='localhost', port=5000)
@@ -0,0 +1,128 @@
+"""
+Micro-batching of LLM requests
+
+Requests arriving within a short window are collected and answered by one
+upstream call. The first request of a window leads the batch: it waits
+until the window closes (or the batch is full), runs at most max_size
+items and hands every waiting request its part of the answer. Items left
+over are led by one of their own requests. If the batch call fails, each
+item is answered on its own.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+
+class MicroBatcher:
+    """
+    Collects items for up to ``window`` seconds and runs them as one batch
+    """
+
+    def __init__(self, run_batch, fallback, window=0.02, max_size=4, key=lambda item: item):
+        """
+        :param run_batch: callable taking a list of items and returning a dict
+            of key -> result; items missing from the dict use the fallback
+        :param fallback: callable answering a single item on its own
+        :param window: seconds to wait for more items
+        :param max_size: run the batch as soon as this many items are waiting, and never run more
+        :param key: callable mapping an item to its key; equal keys share one result
+        """
+        self.run_batch = run_batch
+        self.fallback = fallback
+        self.window = window
+        self.max_size = max_size
+        self.key = key
+        self.pending = OrderedDict()  # key -> (item, Future)
+        self.leading = False  # whether a thread is collecting the current window
+        self.cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    def submit(self, item):
+        """
+        Answers an item, batched with the other items submitted in the same window
+
+        :param item: item to answer
+        :return: result for the item
+        """
+        key = self.key(item)
+        with self.cond:
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = (item, Future())
+                self.pending[key] = entry
+                if len(self.pending) >= self.max_size:
+                    self.cond.notify_all()
+            future = entry[1]
+
+        while True:
+            with self.cond:
+                # wait while another thread collects a window or our item is in a running batch
+                while not future.done() and (self.leading or key not in self.pending):
+                    self.cond.wait()
+                if future.done():
+                    break
+                self.leading = True
+            self._lead()
+
+        result = future.result()
+        if result is _MISSING:
+            with self.cond:
+                self.fallbacks += 1
+            return self.fallback(item)
+        return result
+
+    def _lead(self):
+        deadline = time.monotonic() + self.window
+        with self.cond:
+            while len(self.pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            # at most max_size items per call, the rest wait for the next leader
+            batch = OrderedDict()
+            while self.pending and len(batch) < self.max_size:
+                key, entry = self.pending.popitem(last=False)
+                batch[key] = entry
+            self.leading = False
+            self.batches += 1
+            self.items += len(batch)
+            self.cond.notify_all()
+
+        if len(batch) == 1:
+            # nothing to share the call with
+            key, (item, future) = next(iter(batch.items()))
+            try:
+                future.set_result(self.fallback(item))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                results = self.run_batch([item for item, _ in batch.values()])
+            except Exception as e:
+                # every item is answered on its own instead
+                print(f"Error running batch of {len(batch)}: {str(e)}")
+                results = {}
+            for key, (_, future) in batch.items():
+                future.set_result(results.get(key, _MISSING))
+        with self.cond:
+            self.cond.notify_all()
+
+    def stats(self):
+        """
+        Returns how many batches ran and how full they were
+
+        :return: JSON object
+        """
+        with self.cond:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avgBatchSize": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,252 @@
+"""
+In-process caches for LLM responses
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_key(text):
+    """
+    Normalizes free text (e.g. a job title) for use in a cache key
+
+    :param text: string
+    :return: lower-cased string with collapsed whitespace
+    """
+    return " ".join(str(text).lower().split())
+
+
+class TTLCache:
+    """
+    LRU cache whose entries are fresh for ``ttl`` seconds and may then be
+    served stale for another ``stale_ttl`` seconds while a background thread
+    refreshes them
+    """
+
+    def __init__(self, ttl, stale_ttl=0, max_entries=1024, fallback_errors=(), clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fallback_errors = fallback_errors
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (value, stored_at)
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value and whether it is still fresh
+
+        Expired entries are kept (until evicted) so they can serve as a
+        fallback, but are reported as a miss here.
+
+        :param key: cache key
+        :return: (value, fresh) tuple, or (None, False) on a miss or expired entry
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None, False
+            value, stored_at = entry
+            age = self.clock() - stored_at
+            if age > self.ttl + self.stale_ttl:
+                return None, False
+            self.entries.move_to_end(key)
+            return value, age <= self.ttl
+
+    def get_expired(self, key):
+        """
+        Returns a cached value regardless of its age
+
+        :param key: cache key
+        :return: value or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def fresh_for(self, key):
+        """
+        Returns how many seconds a cached value stays fresh
+
+        :param key: cache key
+        :return: seconds (negative once stale), or None if nothing is cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            return self.ttl - (self.clock() - entry[1])
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry when full
+
+        :param key: cache key
+        :param value: value to cache
+        """
+        with self.lock:
+            self.entries[key] = (value, self.clock())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for key, computing it on a miss
+
+        Stale values are returned immediately and refreshed in a background
+        thread; at most one refresh per key runs at a time. If compute raises
+        one of ``fallback_errors`` and an expired value is still held, that
+        value is returned instead of the error.
+
+        :param key: cache key
+        :param compute: zero-argument callable producing the value
+        :return: (value, status) where status is "hit", "stale", "miss" or "fallback"
+        """
+        value, fresh = self.get(key)
+        if value is not None:
+            if not fresh:
+                self.refresh_in_background(key, compute)
+                return value, "stale"
+            return value, "hit"
+        try:
+            value = compute()
+        except self.fallback_errors:
+            expired = self.get_expired(key)
+            if expired is None:
+                raise
+            return expired, "fallback"
+        self.set(key, value)
+        return value, "miss"
+
+    def refresh_in_background(self, key, compute):
+        """
+        Recomputes a key in a daemon thread unless a refresh is already running
+
+        :param key: cache key
+        :param compute: zero-argument callable producing the value
+        """
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, compute())
+            except Exception as e:
+                print(f"Error refreshing cache entry {key}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def clear(self):
+        """
+        Drops every cached entry
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one upstream call
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and receive the same result. If the call raises,
+    every waiter gets its own copy of the exception.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Runs fn once for all concurrent callers sharing key
+
+        :param key: fingerprint of the request
+        :param fn: zero-argument callable
+        :return: (result, shared) where shared is True for callers that waited on another call
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = SingleFlight._Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            if leader:
+                raise call.error
+            raise _copy_error(call.error) from call.error
+        return call.result, not leader
+
+    def in_flight(self):
+        """
+        Returns the number of distinct keys currently being computed
+
+        :return: int
+        """
+        with self.lock:
+            return len(self.calls)
+
+
+def _copy_error(error):
+    """
+    Returns a fresh instance of an exception so waiters do not share tracebacks
+
+    :param error: exception raised by the leader
+    :return: exception
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+def canonical_json(value):
+    """
+    Serializes JSON data deterministically (sorted keys, no whitespace)
+
+    :param value: JSON serializable value
+    :return: string
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def fingerprint(*parts):
+    """
+    Returns a stable hash of the given strings, used as a request key
+
+    :param parts: strings making up the request (model, prompt, ...)
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -0,0 +1,305 @@
+"""
+Shared Gemini client for the LLM endpoints
+
+The client is built once per process from application.yml and the
+GEMINI_API_KEY environment variable, and the same GenerativeModel (and its
+underlying connection) is reused for every request.
+
+The model behind the client is chosen with LLM_BACKEND: "gemini" (default)
+or "stub" for the offline stand-in in llm_stub. Any object with a
+GenerativeModel compatible generate_content(prompt, stream, request_options)
+method can serve as a backend.
+"""
+import contextlib
+import os
+import threading
+
+import google.generativeai as genai
+
+import llm_cache
+import llm_ratelimit
+import llm_resilience
+import llm_stub
+import llm_telemetry
+import prompts
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+DEFAULT_TIMEOUT = 60  # seconds
+
+_settings = {}
+_client = None
+_lock = threading.Lock()
+
+
+class LLMNotConfiguredError(Exception):
+    """
+    Raised when no Gemini API key is available
+    """
+
+
+def token_counts(response, prompt, text):
+    """
+    Reads the token counts Gemini reports for a response
+
+    Falls back to an estimate from the text length when the response carries
+    no usage metadata.
+
+    :param response: GenerateContentResponse (or its last streamed chunk)
+    :param prompt: prompt string
+    :param text: response text
+    :return: (input tokens, output tokens)
+    """
+    usage = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if not isinstance(input_tokens, int) or not isinstance(output_tokens, int):
+        return prompts.estimate_tokens(prompt), prompts.estimate_tokens(text)
+    return input_tokens, output_tokens
+
+
+class LLMClient:
+    """
+    Thin wrapper around one configured model backend
+    """
+
+    def __init__(self, model, model_name=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT, generation_config=None,
+                 limiter=None, resilience=None):
+        self.model = model
+        self.model_name = model_name
+        self.timeout = timeout
+        self.generation_config = generation_config or {}
+        self.limiter = limiter
+        self.resilience = resilience or llm_resilience.ResilientCaller(deadline=timeout)
+        self.flights = llm_cache.SingleFlight()
+
+    def generate(self, prompt):
+        """
+        Sends a prompt to Gemini and returns the raw response text
+
+        Identical prompts that are already in flight are not sent again; the
+        caller waits for the running request and shares its response.
+
+        :param prompt: prompt string
+        :return: string
+        """
+        call = llm_telemetry.current()
+        if call is not None:
+            call.model = self.model_name
+        key = llm_cache.fingerprint(self.model_name, sorted(self.generation_config.items()), prompt)
+        (text, retries, input_tokens, output_tokens), shared = self.flights.do(key, lambda: self._generate(prompt))
+        if call is not None:
+            call.add_upstream(self.model_name, shared, retries, input_tokens, output_tokens)
+        return text
+
+    def generate_stream(self, prompt):
+        """
+        Sends a prompt to Gemini and yields the response text as it is generated
+
+        Streaming calls are not coalesced, every caller gets its own stream.
+
+        :param prompt: prompt string
+        :return: generator of strings
+        """
+        call = llm_telemetry.current()
+        if call is not None:
+            call.model = self.model_name
+        breaker = self.resilience.breaker
+        if not breaker.allow():
+            raise llm_resilience.CircuitOpenError("Gemini is currently unavailable", breaker.retry_after())
+        outcome = None
+        try:
+            with self._slot():
+                response = self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout})
+                texts = []
+                chunk = None
+                for chunk in response:
+                    if chunk.parts:
+                        texts.append(chunk.text)
+                        yield chunk.text
+            # the last chunk carries the usage of the whole stream
+            input_tokens, output_tokens = token_counts(chunk, prompt, "".join(texts))
+            if call is not None:
+                call.add_upstream(self.model_name, False, 0, input_tokens, output_tokens)
+            outcome = "success"
+        except Exception as e:
+            if llm_resilience.is_retryable(e):
+                outcome = "failure"
+            raise
+        finally:
+            # a client that disconnects closes the generator (GeneratorExit), which
+            # says nothing about upstream health, so the trial slot is just released
+            if outcome == "success":
+                breaker.record_success()
+            elif outcome == "failure":
+                breaker.record_failure()
+            else:
+                breaker.release_trial()
+
+    def _generate(self, prompt):
+        # the slot is taken before the deadline starts: waiting in the queue
+        # ends in a 429 (RateLimitedError), not in a deadline 503, and never
+        # counts as an upstream failure for the circuit breaker
+        with self._slot():
+            (text, input_tokens, output_tokens), retries = self.resilience.call(
+                lambda timeout: self._request(prompt, timeout)
+            )
+        return text, retries, input_tokens, output_tokens
+
+    def _request(self, prompt, timeout):
+        response = self.model.generate_content(
+            prompt, request_options={"timeout": max(1, min(self.timeout, timeout))}
+        )
+        input_tokens, output_tokens = token_counts(response, prompt, response.text)
+        return response.text, input_tokens, output_tokens
+
+    def _slot(self):
+        return self.limiter.slot() if self.limiter else contextlib.nullcontext()
+
+
+def configure(info):
+    """
+    Stores the LLM settings read from application.yml
+
+    Recognised keys are LLM_BACKEND, GEMINI_MODEL, GEMINI_TIMEOUT,
+    GEMINI_TEMPERATURE, GEMINI_MAX_OUTPUT_TOKENS, GEMINI_JSON_MODE and the
+    settings read by limiter_from(), resilience_from() and
+    llm_stub.stub_from(); all of them are optional.
+
+    :param info: dict loaded from application.yml
+    """
+    global _settings
+    _settings = dict(info or {})
+    reset()
+
+
+def generation_config_from(info):
+    """
+    Builds the Gemini generation config from the application settings
+
+    :param info: dict of settings
+    :return: dict
+    """
+    # every prompt asks for a JSON object, so let Gemini enforce it
+    generation_config = {"response_mime_type": "application/json"} if info.get("GEMINI_JSON_MODE", True) else {}
+    if info.get("GEMINI_TEMPERATURE") is not None:
+        generation_config["temperature"] = float(info["GEMINI_TEMPERATURE"])
+    if info.get("GEMINI_MAX_OUTPUT_TOKENS") is not None:
+        generation_config["max_output_tokens"] = int(info["GEMINI_MAX_OUTPUT_TOKENS"])
+    return generation_config
+
+
+def backend_from(info, model_name, generation_config):
+    """
+    Builds the model backend selected by LLM_BACKEND
+
+    :param info: dict of settings
+    :param model_name: Gemini model name
+    :param generation_config: dict from generation_config_from()
+    :return: object with a generate_content method
+    :raises LLMNotConfiguredError: if the Gemini backend has no API key
+    :raises ValueError: if LLM_BACKEND is unknown
+    """
+    backend = info.get("LLM_BACKEND", "gemini")
+    if backend == "stub":
+        return llm_stub.stub_from(info)
+    if backend != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise LLMNotConfiguredError("GEMINI_API_KEY not set in .env")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name, generation_config=generation_config)
+
+
+def limiter_from(info):
+    """
+    Builds the host-wide rate limiter from the application settings
+
+    GEMINI_RPM (default 60, 0 disables the limiter), GEMINI_BURST,
+    GEMINI_MAX_IN_FLIGHT (default 8), GEMINI_QUEUE_TIMEOUT (default 10 seconds)
+    and GEMINI_LIMITS_DB (SQLite file shared by the workers) are recognised.
+
+    :param info: dict of settings
+    :return: RateLimiter or None
+    """
+    requests_per_minute = int(info.get("GEMINI_RPM", 60))
+    if requests_per_minute <= 0:
+        return None
+    return llm_ratelimit.RateLimiter(
+        requests_per_minute,
+        int(info.get("GEMINI_MAX_IN_FLIGHT", 8)),
+        burst=info.get("GEMINI_BURST"),
+        queue_timeout=float(info.get("GEMINI_QUEUE_TIMEOUT", 10)),
+        db_path=info.get("GEMINI_LIMITS_DB"),
+    )
+
+
+def resilience_from(info, timeout):
+    """
+    Builds the retry, hedging and circuit breaker policy from the application settings
+
+    GEMINI_DEADLINE (defaults to the timeout), GEMINI_MAX_RETRIES (2),
+    GEMINI_RETRY_BASE_DELAY (0.5 seconds), GEMINI_HEDGE_PERCENTILE (off),
+    GEMINI_BREAKER_THRESHOLD (5 failures) and GEMINI_BREAKER_RESET (30 seconds)
+    are recognised.
+
+    :param info: dict of settings
+    :param timeout: per request timeout in seconds
+    :return: ResilientCaller
+    """
+    hedge_percentile = info.get("GEMINI_HEDGE_PERCENTILE")
+    return llm_resilience.ResilientCaller(
+        deadline=float(info.get("GEMINI_DEADLINE", timeout)),
+        max_retries=int(info.get("GEMINI_MAX_RETRIES", 2)),
+        base_delay=float(info.get("GEMINI_RETRY_BASE_DELAY", 0.5)),
+        hedge_percentile=float(hedge_percentile) if hedge_percentile else None,
+        breaker=llm_resilience.CircuitBreaker(
+            failure_threshold=int(info.get("GEMINI_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(info.get("GEMINI_BREAKER_RESET", 30)),
+        ),
+    )
+
+
+def model_name():
+    """
+    Returns the name of the configured model, "stub" for the stub backend
+
+    :return: string
+    """
+    if _settings.get("LLM_BACKEND") == "stub":
+        return "stub"
+    return _settings.get("GEMINI_MODEL", DEFAULT_MODEL)
+
+
+def get_client():
+    """
+    Returns the process wide LLM client, creating it on first use
+
+    :return: LLMClient
+    :raises LLMNotConfiguredError: if the Gemini backend is selected and GEMINI_API_KEY is not set
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            generation_config = generation_config_from(_settings)
+            timeout = float(_settings.get("GEMINI_TIMEOUT", DEFAULT_TIMEOUT))
+            _client = LLMClient(
+                backend_from(_settings, _settings.get("GEMINI_MODEL", DEFAULT_MODEL), generation_config),
+                model_name=model_name(),
+                timeout=timeout,
+                generation_config=generation_config,
+                limiter=limiter_from(_settings),
+                resilience=resilience_from(_settings, timeout),
+            )
+    return _client
+
+
+def reset():
+    """
+    Drops the shared client so the next call rebuilds it
+    """
+    global _client
+    with _lock:
+        _client = None
@@ -0,0 +1,193 @@
+"""
+Background queue for slow LLM work
+
+Endpoints submit a job and immediately return its id; the work runs on a
+small thread pool and clients fetch the result by polling or over a
+Server-Sent Events stream. This keeps Flask workers free for cheap requests.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """
+    Raised when too many jobs are already waiting
+    """
+
+
+class JobError(Exception):
+    """
+    Raised by job functions to fail a job with a message meant for the client
+    """
+
+
+class Job:
+    """
+    One unit of LLM work and its outcome
+    """
+
+    def __init__(self, kind, owner=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    def to_json(self):
+        """
+        Returns the job state in JSON object
+
+        :return: JSON object
+        """
+        data = {"id": self.id, "kind": self.kind, "status": self.status}
+        if self.started_at is not None:
+            data["waitSeconds"] = round(self.started_at - self.submitted_at, 3)
+        if self.finished_at is not None:
+            data["runSeconds"] = round(self.finished_at - self.started_at, 3)
+        if self.status == DONE:
+            data["result"] = self.result
+        if self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a thread pool and keeps their results for a while
+    """
+
+    def __init__(self, workers=4, max_pending=100, result_ttl=600):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-job")
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, kind, fn, owner=None):
+        """
+        Queues fn to run in the background
+
+        :param kind: job type shown to clients
+        :param fn: zero-argument callable returning a JSON serializable result
+        :param owner: id of the user who submitted the job
+        :return: Job
+        :raises QueueFullError: if max_pending jobs are already queued
+        """
+        with self.lock:
+            self._prune()
+            if self._count(QUEUED) >= self.max_pending:
+                raise QueueFullError("Too many LLM jobs queued")
+            job = Job(kind, owner)
+            self.jobs[job.id] = job
+        self.pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        """
+        Returns a job by id
+
+        :param job_id: job id
+        :return: Job or None
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        """
+        Returns queue depth and wait time figures
+
+        :return: JSON object
+        """
+        with self.lock:
+            now = time.time()
+            queued = [job for job in self.jobs.values() if job.status == QUEUED]
+            started = self.completed + self.failed + self._count(RUNNING)
+            return {
+                "queued": len(queued),
+                "running": self._count(RUNNING),
+                "completed": self.completed,
+                "failed": self.failed,
+                "oldestQueuedSeconds": round(max((now - job.submitted_at for job in queued), default=0.0), 3),
+                "avgWaitSeconds": round(self.total_wait / started, 3) if started else 0.0,
+                "maxWaitSeconds": round(self.max_wait, 3),
+            }
+
+    def _run(self, job, fn):
+        with self.lock:
+            job.status = RUNNING
+            job.started_at = time.time()
+            wait = job.started_at - job.submitted_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            result = fn()
+            with self.lock:
+                job.result = result
+                job.status = DONE
+                self.completed += 1
+        except Exception as e:
+            message = str(e) if isinstance(e, JobError) else "Internal server error"
+            if not isinstance(e, JobError):
+                print(f"Error in LLM job {job.id}: {str(e)}")
+            with self.lock:
+                job.error = message
+                job.status = FAILED
+                self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            job.finished.set()
+
+    def _count(self, status):
+        return sum(1 for job in self.jobs.values() if job.status == status)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+
+def sse_event(event, data):
+    """
+    Formats one Server-Sent Event
+
+    :param event: event name
+    :param data: JSON serializable payload
+    :return: string
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_job(job, keepalive=15):
+    """
+    Yields SSE messages for a job until it finishes
+
+    A status event is sent first, then keep-alive comments while the job is
+    pending, and finally a "result" or "error" event carrying the job JSON.
+
+    :param job: Job
+    :param keepalive: seconds between keep-alive comments
+    :return: generator of strings
+    """
+    yield sse_event("status", {"id": job.id, "status": job.status})
+    while not job.finished.wait(keepalive):
+        yield ": keep-alive\n\n"
+    yield sse_event("result" if job.status == DONE else "error", job.to_json())
@@ -0,0 +1,223 @@
+"""
+Tolerant parsing of the JSON answers returned by Gemini
+
+Answers are parsed strictly first. If that fails, the outermost JSON object
+is cut out of any surrounding prose or code fences and common defects are
+repaired (trailing commas, comments, smart quotes, Python literals, missing
+closing brackets). Only when that still fails is the model asked, once, to
+fix the broken part.
+"""
+import json
+import re
+import threading
+from collections import Counter
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+_SMART_QUOTES = {"\u201c": '"', "\u201d": '"'}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PYTHON_LITERAL_RE = re.compile(r"(True|False|None)\b")
+_TYPE_NAMES = {str: "string", list: "array", dict: "object", int: "number", float: "number", bool: "boolean"}
+
+REASK_PROMPT = """
+The JSON below could not be parsed: {error}.
+The problem is near: {excerpt}
+Return only the corrected JSON object, with the same content and no other text.
+
+{document}
+"""
+
+
+def _count(outcome):
+    with _counts_lock:
+        _counts[outcome] += 1
+
+
+def stats():
+    """
+    Returns how often answers parsed cleanly, needed repair, needed a re-ask or failed
+
+    :return: dict
+    """
+    with _counts_lock:
+        return dict(_counts)
+
+
+def extract_object(text):
+    """
+    Cuts the outermost JSON object or array out of a model answer
+
+    :param text: raw answer
+    :return: string starting at the first { or [ and ending at its matching
+        bracket, or running to the end of the text if it is never closed
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def repair(text):
+    """
+    Fixes the JSON defects language models commonly produce
+
+    :param text: JSON-like string
+    :return: repaired string (not guaranteed to be valid)
+    """
+    for smart, plain in _SMART_QUOTES.items():
+        text = text.replace(smart, plain)
+
+    out = []
+    closers = []
+    in_string = False
+    escaped = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            i += 1
+            continue
+        if char == '"':
+            in_string = True
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end == -1 else end + 2
+            continue
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            # drop a trailing comma before the closing bracket
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if closers:
+                closers.pop()
+        else:
+            match = _PYTHON_LITERAL_RE.match(text, i)
+            if match and not (out and (out[-1].isalnum() or out[-1] == "_")):
+                out.append(_PYTHON_LITERALS[match.group(0)])
+                i += len(match.group(0))
+                continue
+        out.append(char)
+        i += 1
+
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    if repaired.endswith(","):
+        repaired = repaired[:-1]
+    return repaired + "".join(reversed(closers))
+
+
+def validate(data, schema):
+    """
+    Checks parsed JSON against a minimal schema
+
+    :param data: parsed JSON
+    :param schema: dict with "required" (list of keys) and "properties"
+        (key -> python type or tuple of types)
+    :raises json.JSONDecodeError: if data does not match the schema
+    """
+    if schema is None:
+        return
+    if not isinstance(data, dict):
+        raise json.JSONDecodeError("expected a JSON object", json.dumps(data), 0)
+    for key in schema.get("required", []):
+        if key not in data:
+            raise json.JSONDecodeError(f'missing required key "{key}"', json.dumps(data), 0)
+    for key, expected in schema.get("properties", {}).items():
+        if key in data and data[key] is not None and not isinstance(data[key], expected):
+            types = expected if isinstance(expected, tuple) else (expected,)
+            names = " or ".join(sorted({_TYPE_NAMES.get(t, t.__name__) for t in types}))
+            raise json.JSONDecodeError(f'"{key}" should be {names}', json.dumps(data), 0)
+
+
+def _parse_tolerant(text, schema):
+    try:
+        data = json.loads(text)
+        outcome = "clean"
+    except json.JSONDecodeError:
+        candidate = extract_object(text)
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            data = json.loads(repair(candidate))
+        outcome = "repaired"
+    validate(data, schema)
+    return data, outcome
+
+
+def _excerpt(err, width=80):
+    doc = err.doc or ""
+    start = max(0, err.pos - width // 2)
+    return doc[start:start + width] or doc[:width]
+
+
+def loads(text, schema=None, reask=None):
+    """
+    Parses a model answer as JSON, repairing it or re-asking the model once if needed
+
+    :param text: raw answer
+    :param schema: optional schema for validate()
+    :param reask: optional callable sending a prompt to the model and returning its answer
+    :return: parsed JSON
+    :raises json.JSONDecodeError: if no valid JSON could be obtained
+    """
+    try:
+        data, outcome = _parse_tolerant(text, schema)
+        _count(outcome)
+        return data
+    except json.JSONDecodeError as err:
+        if reask is None:
+            _count("failed")
+            print(f"Error: Gemini response was not valid JSON: {text}")
+            raise
+        first_error = err
+
+    answer = reask(REASK_PROMPT.format(
+        error=first_error.msg, excerpt=_excerpt(first_error), document=extract_object(text)
+    ))
+    try:
+        data, _ = _parse_tolerant(answer, schema)
+        _count("reasked")
+        return data
+    except json.JSONDecodeError:
+        _count("failed")
+        print(f"Error: Gemini response was not valid JSON after a retry: {answer}")
+        raise
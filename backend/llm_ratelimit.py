@@ -0,0 +1,138 @@
+"""
+Host-wide rate limiting for Gemini calls
+
+A token bucket (requests per minute) and an in-flight cap are kept in a small
+SQLite file, so every worker process on the host shares the same budget.
+Writers take SQLite's database lock with BEGIN IMMEDIATE, which serializes
+the check-and-update across processes.
+"""
+import math
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "jtracker-llm-limits.sqlite")
+
+
+class RateLimitedError(Exception):
+    """
+    Raised when no Gemini slot frees up before the caller's deadline
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Too many LLM requests, please retry later")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket plus concurrency cap shared through a SQLite file
+    """
+
+    def __init__(self, requests_per_minute, max_in_flight, burst=None, queue_timeout=10,
+                 lease_timeout=300, db_path=None, name="gemini"):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or requests_per_minute)
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.lease_timeout = lease_timeout
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self.name = name
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, name TEXT, started REAL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def try_acquire(self):
+        """
+        Takes a token and an in-flight slot if both are available
+
+        :return: (lease id, None) on success or (None, seconds to wait) otherwise
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            conn.execute("DELETE FROM leases WHERE name = ? AND started < ?",
+                         (self.name, now - self.lease_timeout))
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (self.name,)).fetchone()[0]
+
+            lease = None
+            wait = None
+            if tokens < 1:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else self.queue_timeout
+            elif in_flight >= self.max_in_flight:
+                wait = 0.05
+            else:
+                tokens -= 1
+                lease = str(uuid.uuid4())
+                conn.execute("INSERT INTO leases (id, name, started) VALUES (?, ?, ?)", (lease, self.name, now))
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+            return lease, wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, timeout=None):
+        """
+        Waits for a token and an in-flight slot
+
+        :param timeout: seconds to wait, defaults to queue_timeout
+        :return: lease id to pass to release()
+        :raises RateLimitedError: if nothing frees up in time
+        """
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        while True:
+            lease, wait = self.try_acquire()
+            if lease is not None:
+                return lease
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                # no point queueing if the next token arrives after our deadline
+                raise RateLimitedError(max(1, math.ceil(wait)))
+            time.sleep(min(wait, remaining))
+
+    def release(self, lease):
+        """
+        Frees the in-flight slot held by a lease
+
+        :param lease: lease id returned by acquire()
+        """
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease,))
+        finally:
+            conn.close()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """
+        Holds a Gemini slot for the duration of a with block
+
+        :param timeout: seconds to wait for the slot
+        """
+        lease = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(lease)
@@ -0,0 +1,243 @@
+"""
+Deadlines, retries, hedging and a circuit breaker for Gemini calls
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as google_exceptions
+
+# upstream errors worth another attempt; anything else (bad request, auth, ...) fails at once
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when Gemini cannot answer right now; clients should retry later
+    """
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """
+    Raised without calling Gemini while the circuit breaker is open
+    """
+
+
+class LLMDeadlineExceededError(LLMUnavailableError):
+    """
+    Raised when a call does not finish within its deadline
+    """
+
+
+class LLMUpstreamError(LLMUnavailableError):
+    """
+    Raised when Gemini keeps failing after all retries
+    """
+
+
+def is_retryable(err):
+    """
+    Checks whether an upstream error is worth retrying
+
+    :param err: exception
+    :return: boolean
+    """
+    return isinstance(err, RETRYABLE_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and lets a single
+    trial call through once ``reset_timeout`` seconds have passed
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.clock() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """
+        Checks whether a call may go upstream
+
+        :return: boolean
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at < self.reset_timeout or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def retry_after(self):
+        """
+        Returns the seconds until the breaker lets a trial call through
+
+        :return: int
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            return max(1, int(self.reset_timeout - (self.clock() - self.opened_at)) + 1)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release_trial(self):
+        """
+        Ends a trial call whose outcome says nothing about upstream health
+        """
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent call latencies to derive percentiles
+    """
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p, min_samples=20):
+        """
+        Returns the p-th percentile of the recent latencies
+
+        :param p: percentile between 0 and 100
+        :param min_samples: return None until this many samples were recorded
+        :return: float or None
+        """
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResilientCaller:
+    """
+    Runs upstream calls with a deadline, jittered exponential retries, an
+    optional hedged request and a circuit breaker
+    """
+
+    def __init__(self, deadline=60, max_retries=2, base_delay=0.5, max_delay=8,
+                 hedge_percentile=None, breaker=None, workers=32):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-call")
+
+    def call(self, fn, deadline=None):
+        """
+        Calls fn(timeout) until it succeeds, fails permanently or runs out of time
+
+        :param fn: callable taking the seconds left for this attempt
+        :param deadline: overall seconds allowed, defaults to the configured deadline
+        :return: (result, number of retries used)
+        :raises CircuitOpenError: if the circuit breaker is open
+        :raises LLMDeadlineExceededError: if the deadline passes
+        :raises LLMUpstreamError: if retryable errors persist after all retries
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini is currently unavailable", self.breaker.retry_after())
+
+        deadline_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(fn, deadline_at)
+                self.breaker.record_success()
+                return result, attempt
+            except LLMDeadlineExceededError:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release_trial()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                # full jitter keeps retries from many workers from lining up
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline_at:
+                    raise LLMUpstreamError(f"Gemini request failed: {str(e)}") from e
+                if not self.breaker.allow():
+                    raise CircuitOpenError("Gemini is currently unavailable", self.breaker.retry_after()) from e
+                time.sleep(delay)
+
+    def _attempt(self, fn, deadline_at):
+        started = time.monotonic()
+        futures = {self.pool.submit(fn, deadline_at - started)}
+        hedge_after = self.latencies.percentile(self.hedge_percentile) if self.hedge_percentile else None
+
+        while futures:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceededError("Gemini did not answer in time")
+            timeout = remaining
+            if hedge_after is not None:
+                timeout = min(remaining, max(0.0, started + hedge_after - time.monotonic()))
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if hedge_after is not None:
+                    # the first request is slower than usual: race a second one against it
+                    futures.add(self.pool.submit(fn, deadline_at - time.monotonic()))
+                    hedge_after = None
+                continue
+            for future in done:
+                if future.exception() is None:
+                    self.latencies.record(time.monotonic() - started)
+                    return future.result()
+            if not futures:
+                raise next(iter(done)).exception()
+        raise LLMDeadlineExceededError("Gemini did not answer in time")
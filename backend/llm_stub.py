@@ -0,0 +1,243 @@
+"""
+Deterministic stand-in for Gemini used to load and soak test the LLM endpoints
+
+Select it with ``LLM_BACKEND: stub`` in application.yml. It answers every
+prompt with schema-valid canned JSON derived from the prompt itself, after a
+log-normally distributed delay and with a configurable share of upstream
+errors, so the whole pipeline (caching, rate limits, retries, circuit
+breaker) can be exercised without a Gemini key or network access.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+# upstream failures the stub can simulate, by the name used in LLM_STUB_ERRORS
+ERRORS = {
+    "rate_limited": google_exceptions.TooManyRequests,
+    "unavailable": google_exceptions.ServiceUnavailable,
+    "internal": google_exceptions.InternalServerError,
+    "bad_request": google_exceptions.BadRequest,
+}
+
+SKILLS = [
+    "Python", "Java", "JavaScript", "TypeScript", "C++", "Go", "SQL", "React", "Node.js", "AWS",
+    "Docker", "Kubernetes", "Git", "Linux", "Machine Learning", "Data Analysis", "Excel", "Figma",
+]
+
+
+class StubResponse:
+    """
+    Mimics the parts of a Gemini response the client reads
+    """
+
+    def __init__(self, text, input_tokens, output_tokens=None):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=input_tokens,
+            candidates_token_count=output_tokens if output_tokens is not None else _tokens(text),
+        )
+
+
+class StubModel:
+    """
+    Drop-in replacement for genai.GenerativeModel.generate_content
+    """
+
+    def __init__(self, latency_ms=200, latency_sigma=0.5, error_rate=0.0, errors=None, seed=None, chunk_size=64):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.errors = errors or {"unavailable": 1.0}
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        """
+        Answers a prompt like Gemini would
+
+        :param prompt: prompt string
+        :param stream: yield the answer in chunks
+        :param request_options: dict with an optional "timeout" in seconds
+        :return: StubResponse or generator of StubResponse chunks
+        :raises google.api_core.exceptions.GoogleAPIError: for simulated failures
+        """
+        with self.lock:
+            delay = self.latency_ms / 1000.0 * math.exp(self.random.gauss(0, self.latency_sigma)) \
+                if self.latency_ms > 0 else 0.0
+            error = self._pick_error() if self.random.random() < self.error_rate else None
+
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded("Stub LLM did not answer in time")
+        text = answer(prompt)
+        if not stream:
+            time.sleep(delay)
+            if error:
+                raise ERRORS[error](f"Stub LLM simulated {error}")
+            return StubResponse(text, _tokens(prompt))
+        return self._stream(prompt, text, delay, error)
+
+    def _stream(self, prompt, text, delay, error):
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for i, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            if error and i == len(pieces) // 2:
+                raise ERRORS[error](f"Stub LLM simulated {error}")
+            last = i == len(pieces) - 1
+            yield StubResponse(piece, _tokens(prompt), _tokens(text) if last else 0)
+
+    def _pick_error(self):
+        names = sorted(self.errors)
+        return self.random.choices(names, weights=[self.errors[name] for name in names])[0]
+
+
+def stub_from(info):
+    """
+    Builds the stub model from the application settings
+
+    LLM_STUB_LATENCY_MS (median delay, default 200), LLM_STUB_LATENCY_SIGMA
+    (spread of the log-normal delay, default 0.5), LLM_STUB_ERROR_RATE
+    (default 0), LLM_STUB_ERRORS (weights by error name, see ERRORS) and
+    LLM_STUB_SEED are recognised.
+
+    :param info: dict of settings
+    :return: StubModel
+    """
+    errors = info.get("LLM_STUB_ERRORS")
+    unknown = set(errors or {}) - set(ERRORS)
+    if unknown:
+        raise ValueError(f"Unknown LLM_STUB_ERRORS: {', '.join(sorted(unknown))}")
+    return StubModel(
+        latency_ms=float(info.get("LLM_STUB_LATENCY_MS", 200)),
+        latency_sigma=float(info.get("LLM_STUB_LATENCY_SIGMA", 0.5)),
+        error_rate=float(info.get("LLM_STUB_ERROR_RATE", 0)),
+        errors={name: float(weight) for name, weight in errors.items()} if errors else None,
+        seed=info.get("LLM_STUB_SEED"),
+    )
+
+
+def _tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _digest(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+
+
+def _json_after(label, prompt):
+    match = re.search(label + r": (.*)", prompt)
+    if not match:
+        return {}
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return {}
+
+
+def _career_insights(title):
+    digest = _digest(title.lower())
+    core = [SKILLS[(digest + i * 7) % len(SKILLS)] for i in range(4)]
+    extra = [SKILLS[(digest + i * 5 + 3) % len(SKILLS)] for i in range(3)]
+    core = list(dict.fromkeys(core))
+    extra = [skill for skill in dict.fromkeys(extra) if skill not in core]
+    entry = 50 + digest % 40
+    return {
+        "roleOverview": f"A {title} designs, builds and maintains solutions in their field.",
+        "technicalSkills": [
+            {"category": f"Core Skills for {title}", "tools": core},
+            {"category": "Additional Technical Skills", "tools": extra},
+            {"category": "Emerging Technologies", "tools": ["Generative AI"]},
+        ],
+        "softSkills": ["Communication", "Teamwork", "Problem solving", "Time management", "Adaptability"],
+        "certifications": [
+            {"name": f"{core[0]} Professional", "provider": "Stub Academy", "level": "Intermediate",
+             "description": f"Shows {core[0]} skills relevant to {title}"},
+        ],
+        "projectIdeas": [
+            {"title": f"{title} portfolio project", "description": f"Build a small project using {core[0]}",
+             "technologies": core[:2], "learningOutcomes": ["End to end delivery"]},
+        ],
+        "industryTrends": ["Automation", "Cloud adoption", "AI assistance", "Remote work", "Security"],
+        "salaryRange": {
+            "entry": f"${entry}k - ${entry + 20}k",
+            "mid": f"${entry + 25}k - ${entry + 50}k",
+            "senior": f"${entry + 55}k - ${entry + 90}k",
+            "factors": ["Location", "Experience", "Company size"],
+        },
+        "learningResources": [
+            {"name": f"{core[0]} fundamentals", "type": "Course", "cost": "Free", "url": "https://example.com",
+             "duration": "4 weeks", "description": f"Covers the {core[0]} basics"},
+        ],
+        "prerequisites": {
+            "education": ["Bachelor's degree or equivalent experience"],
+            "experience": ["Internship or personal projects"],
+            "skills": core[:2],
+        },
+        "careerPath": {
+            "entryLevel": f"Junior {title}",
+            "midLevel": title,
+            "senior": f"Senior {title}",
+            "advancement": [f"Lead {title}", "Engineering Manager"],
+        },
+    }
+
+
+def _parsed_resume(prompt):
+    lowered = prompt.lower()
+    skills = [skill for skill in SKILLS if re.search(r"(?<!\w)" + re.escape(skill.lower()) + r"(?!\w)", lowered)]
+    return {
+        "skills": skills or ["Communication"],
+        "experience": ["Software Developer at Stub Corp"],
+        "education": ["BS Computer Science"],
+        "certifications": [],
+    }
+
+
+def _comparison(prompt):
+    resume = _json_after("Resume", prompt)
+    insights = _json_after("Job Requirements", prompt)
+    have = {skill.lower(): skill for skill in resume.get("skills", []) if isinstance(skill, str)}
+    wanted = []
+    for group in insights.get("technicalSkills", []):
+        if isinstance(group, dict):
+            wanted.extend(tool for tool in group.get("tools", []) if isinstance(tool, str))
+    matching = [tool for tool in wanted if tool.lower() in have]
+    missing = [tool for tool in wanted if tool.lower() not in have]
+    return {
+        "overallMatch": round(100 * len(matching) / len(wanted)) if wanted else 50,
+        "matchingSkills": matching,
+        "missingSkills": missing,
+        "recommendations": [f"Learn {tool}" for tool in missing[:3]] or ["Keep your resume up to date"],
+    }
+
+
+def answer(prompt):
+    """
+    Returns the canned JSON answer for one of the app's prompts
+
+    :param prompt: prompt string
+    :return: JSON string
+    """
+    batch = re.search(r"career guide for each of these roles: (\[.*?\])\.", prompt)
+    single = re.search(r"career guide for an? (.+?) role", prompt)
+    if batch:
+        result = {title: _career_insights(title) for title in json.loads(batch.group(1))}
+    elif single:
+        result = _career_insights(single.group(1))
+    elif "Parse this resume" in prompt:
+        result = _parsed_resume(prompt)
+    elif "Compare this resume" in prompt:
+        result = _comparison(prompt)
+    else:
+        result = {}
+    return json.dumps(result)
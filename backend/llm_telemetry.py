@@ -0,0 +1,249 @@
+"""
+Per-call telemetry for the LLM endpoints
+
+Every LLM operation runs inside track(), which collects the model, prompt
+version, latency, token counts, retries, cache status and error class of
+the call. LLMClient adds what it learns about the upstream request to the
+call being tracked on the current thread. Finished calls are aggregated
+into counters and histograms per (endpoint, model, prompt version).
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_local = threading.local()
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, Prometheus style
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bucket holding the p-th percentile
+
+        :param p: percentile between 0 and 100
+        :return: number, None without observations or inf past the last bucket
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_json(self):
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": _finite(self.percentile(50)),
+            "p95": _finite(self.percentile(95)),
+            "buckets": buckets,
+        }
+
+
+def _finite(value):
+    return "+Inf" if value == float("inf") else value
+
+
+class Series:
+    """
+    Aggregated calls of one endpoint, model and prompt version
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.upstream_calls = 0
+        self.retries = 0
+        self.cache = Counter()
+        self.errors = Counter()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.input_tokens = Histogram(TOKEN_BUCKETS)
+        self.output_tokens = Histogram(TOKEN_BUCKETS)
+
+    def add(self, call):
+        self.calls += 1
+        self.upstream_calls += call.upstream_calls
+        self.retries += call.retries
+        self.cache[call.cache] += 1
+        if call.error:
+            self.errors[call.error] += 1
+        self.latency.observe(call.latency)
+        if call.upstream_calls:
+            self.input_tokens.observe(call.input_tokens)
+            self.output_tokens.observe(call.output_tokens)
+
+    def to_json(self):
+        return {
+            "calls": self.calls,
+            "upstreamCalls": self.upstream_calls,
+            "retries": self.retries,
+            "cache": dict(self.cache),
+            "errors": dict(self.errors),
+            "latencySeconds": self.latency.to_json(),
+            "inputTokens": self.input_tokens.to_json(),
+            "outputTokens": self.output_tokens.to_json(),
+        }
+
+
+class Call:
+    """
+    What is known about one LLM operation while it runs
+    """
+
+    def __init__(self, endpoint, prompt_version, model=None, cache="miss"):
+        self.endpoint = endpoint
+        self.prompt_version = prompt_version
+        self.model = model
+        self.cache = cache
+        self.latency = 0.0
+        self.upstream_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.error = None
+
+    def add_upstream(self, model, shared, retries=0, input_tokens=0, output_tokens=0):
+        """
+        Adds one LLMClient request (a JSON repair request adds a second one)
+
+        :param model: model name
+        :param shared: whether the answer came from an identical request already in flight
+        :param retries: retries the request needed
+        :param input_tokens: prompt tokens
+        :param output_tokens: answer tokens
+        """
+        self.model = model
+        if shared:
+            if not self.upstream_calls:
+                self.cache = "coalesced"
+            return
+        self.upstream_calls += 1
+        self.retries += retries
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+
+class Telemetry:
+    """
+    Thread safe store of the aggregated series
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def add(self, call):
+        key = (call.endpoint, call.model or "unknown", call.prompt_version)
+        with self.lock:
+            self.series.setdefault(key, Series()).add(call)
+
+    def snapshot(self):
+        """
+        Returns every series as a JSON list
+
+        :return: list of JSON objects
+        """
+        with self.lock:
+            return [
+                dict(endpoint=endpoint, model=model, promptVersion=version, **series.to_json())
+                for (endpoint, model, version), series in sorted(self.series.items())
+            ]
+
+
+_telemetry = Telemetry()
+
+
+@contextmanager
+def track(endpoint, prompt_version, model=None):
+    """
+    Records one LLM operation run inside the with block
+
+    Nested tracking (an operation calling another tracked one) only records
+    the outermost call.
+
+    :param endpoint: name of the LLM operation, e.g. "career-insights"
+    :param prompt_version: version of the prompt used
+    :param model: model name, filled in by LLMClient if not known yet
+    :return: Call being recorded
+    """
+    if getattr(_local, "call", None) is not None:
+        yield _local.call
+        return
+    call = Call(endpoint, prompt_version, model)
+    _local.call = call
+    started = time.monotonic()
+    try:
+        yield call
+    except BaseException as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        _local.call = None
+        call.latency = time.monotonic() - started
+        _telemetry.add(call)
+
+
+def record_cached(endpoint, prompt_version, model, cache, latency):
+    """
+    Records an operation answered without an LLM call of its own
+
+    :param endpoint: name of the LLM operation
+    :param prompt_version: version of the prompt
+    :param model: model name
+    :param cache: cache status ("hit", "stale", "fallback", "skipped", "local", or "batched" when
+        the answer came from a call recorded under another operation)
+    :param latency: seconds the lookup took
+    """
+    call = Call(endpoint, prompt_version, model, cache)
+    call.latency = latency
+    _telemetry.add(call)
+
+
+def current():
+    """
+    Returns the call tracked on this thread
+
+    :return: Call or None
+    """
+    return getattr(_local, "call", None)
+
+
+def snapshot():
+    """
+    Returns the aggregated telemetry
+
+    :return: list of JSON objects
+    """
+    return _telemetry.snapshot()
+
+
+def reset():
+    """
+    Drops all aggregated telemetry
+    """
+    global _telemetry
+    _telemetry = Telemetry()
@@ -0,0 +1,114 @@
+"""
+Instant resume-to-job match score computed locally
+
+The required tools in the career insights' technicalSkills are compared
+with the words of the parsed resume. Each tool is covered by the share of
+its (IDF weighted) tokens found in the resume, and earlier skill categories
+("Core Skills") weigh more than later ones. This runs in well under a
+millisecond, so the score can be shown while Gemini writes the detailed
+comparison, and clearly poor matches can skip Gemini altogether.
+"""
+import re
+
+import numpy as np
+
+MATCH_THRESHOLD = 0.75  # share of a tool's weighted tokens the resume must contain
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+
+def tokenize(text):
+    """
+    Splits text into lower-case tokens, keeping names like c++, c# and node.js whole
+
+    :param text: string
+    :return: list of tokens
+    """
+    return [token.rstrip(".") for token in _TOKEN_RE.findall(str(text).lower())]
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+
+
+def required_skills(job_insights):
+    """
+    Lists the tools of the insights' technicalSkills with the index of their category
+
+    :param job_insights: career insights dict
+    :return: list of (tool, category index) pairs without duplicates
+    """
+    skills = []
+    seen = set()
+    groups = job_insights.get("technicalSkills") if isinstance(job_insights, dict) else None
+    for index, group in enumerate(groups or []):
+        tools = group.get("tools", []) if isinstance(group, dict) else []
+        for tool in tools:
+            if isinstance(tool, str) and tool.strip() and tool.lower() not in seen:
+                seen.add(tool.lower())
+                skills.append((tool.strip(), index))
+    return skills
+
+
+def score(resume, job_insights):
+    """
+    Scores how well a parsed resume covers the technical skills of a job
+
+    :param resume: parsed resume dict
+    :param job_insights: career insights dict
+    :return: dict with overallMatch (0-100), matchingSkills and missingSkills
+    """
+    skills = required_skills(job_insights)
+    if not skills:
+        return {"overallMatch": 0, "matchingSkills": [], "missingSkills": []}
+
+    resume_tokens = set()
+    for text in _strings(resume if isinstance(resume, dict) else {}):
+        resume_tokens.update(tokenize(text))
+
+    skill_tokens = [set(tokenize(tool)) or {tool.lower()} for tool, _ in skills]
+    vocabulary = sorted(set().union(*skill_tokens))
+    column = {token: i for i, token in enumerate(vocabulary)}
+
+    # tools x tokens incidence matrix
+    incidence = np.zeros((len(skills), len(vocabulary)))
+    for row, tokens in enumerate(skill_tokens):
+        incidence[row, [column[token] for token in tokens]] = 1.0
+    present = np.array([token in resume_tokens for token in vocabulary], dtype=float)
+
+    # tokens shared by many tools (e.g. "aws", "google") say little about any single one
+    document_frequency = incidence.sum(axis=0)
+    idf = np.log((1 + len(skills)) / (1 + document_frequency)) + 1
+    weighted = incidence * idf
+    coverage = (weighted @ present) / weighted.sum(axis=1)
+
+    category_weight = 1.0 / (1 + np.array([index for _, index in skills], dtype=float))
+    overall = float(category_weight @ coverage / category_weight.sum())
+
+    matched = coverage >= MATCH_THRESHOLD
+    return {
+        "overallMatch": int(round(100 * overall)),
+        "matchingSkills": [tool for (tool, _), hit in zip(skills, matched) if hit],
+        "missingSkills": [tool for (tool, _), hit in zip(skills, matched) if not hit],
+    }
+
+
+def as_comparison(local):
+    """
+    Turns a local score into the comparison structure returned by /compare-resume
+
+    :param local: dict returned by score()
+    :return: dict with overallMatch, matchingSkills, missingSkills and recommendations
+    """
+    return dict(
+        local,
+        recommendations=[f"Gain experience with {skill}" for skill in local["missingSkills"][:5]],
+        source="local",
+    )
@@ -0,0 +1,381 @@
+"""
+Prompts sent to Gemini by the LLM endpoints
+
+Bump the matching *_PROMPT_VERSION whenever a prompt changes, so cached
+responses produced by the old prompt are not served.
+
+Inputs are compacted before they are inlined: resume text is stripped of
+whitespace noise, only the fields that matter for matching are kept and
+everything is trimmed to a token budget (PROMPT_RESUME_TOKEN_BUDGET and
+PROMPT_COMPARISON_TOKEN_BUDGET in application.yml).
+"""
+import json
+import re
+
+CAREER_INSIGHTS_PROMPT_VERSION = "1"
+CAREER_INSIGHTS_BATCH_PROMPT_VERSION = "1"
+RESUME_PARSE_PROMPT_VERSION = "2"
+COMPARISON_PROMPT_VERSION = "2"
+
+# prompt version of each LLM operation, as reported in the telemetry
+PROMPT_VERSIONS = {
+    "career-insights": CAREER_INSIGHTS_PROMPT_VERSION,
+    "career-insights-batch": CAREER_INSIGHTS_BATCH_PROMPT_VERSION,
+    "parse-resume": RESUME_PARSE_PROMPT_VERSION,
+    "compare-resume": COMPARISON_PROMPT_VERSION,
+}
+
+DEFAULT_RESUME_TOKEN_BUDGET = 2000
+DEFAULT_COMPARISON_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4  # rough average for English text
+
+# fields of the parsed resume and of the career insights used by the comparison
+RESUME_MATCH_FIELDS = ("skills", "experience", "education", "certifications")
+INSIGHTS_MATCH_FIELDS = ("technicalSkills", "softSkills", "certifications", "prerequisites")
+
+_budgets = {
+    "resume": DEFAULT_RESUME_TOKEN_BUDGET,
+    "comparison": DEFAULT_COMPARISON_TOKEN_BUDGET,
+}
+
+
+def configure(info):
+    """
+    Reads the prompt token budgets from application.yml
+
+    :param info: dict loaded from application.yml
+    """
+    info = info or {}
+    _budgets["resume"] = int(info.get("PROMPT_RESUME_TOKEN_BUDGET", DEFAULT_RESUME_TOKEN_BUDGET))
+    _budgets["comparison"] = int(info.get("PROMPT_COMPARISON_TOKEN_BUDGET", DEFAULT_COMPARISON_TOKEN_BUDGET))
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens Gemini will count for a text
+
+    :param text: string
+    :return: int
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def normalize_text(text):
+    """
+    Removes the whitespace noise PDF extraction leaves in resume text
+
+    :param text: extracted text
+    :return: string with single spaces and at most one blank line in a row
+    """
+    text = re.sub(r"[^\S\n]+", " ", text or "")
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def trim_to_budget(text, budget):
+    """
+    Cuts a text down to a token budget, preferring to cut at a line break
+
+    :param text: string
+    :param budget: maximum number of tokens
+    :return: string
+    """
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+
+def _clean(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, list):
+        cleaned = []
+        seen = set()
+        for item in value:
+            item = _clean(item)
+            key = item.lower() if isinstance(item, str) else json.dumps(item, sort_keys=True)
+            if item not in (None, "", [], {}) and key not in seen:
+                seen.add(key)
+                cleaned.append(item)
+        return cleaned
+    if isinstance(value, dict):
+        cleaned = {key: _clean(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if item not in (None, "", [], {})}
+    return value
+
+
+def compact_resume(resume):
+    """
+    Keeps the parts of a parsed resume that matter for matching
+
+    :param resume: parsed resume dict
+    :return: dict without empty, duplicate or unrelated fields
+    """
+    return _clean({field: resume.get(field) for field in RESUME_MATCH_FIELDS if isinstance(resume, dict)})
+
+
+def compact_insights(job_insights):
+    """
+    Keeps the skill and requirement parts of the career insights
+
+    Salary, learning resources, trends and project ideas are not needed to
+    compare a resume and make up most of the insights.
+
+    :param job_insights: career insights dict
+    :return: dict
+    """
+    if not isinstance(job_insights, dict):
+        return {}
+    compact = {field: job_insights.get(field) for field in INSIGHTS_MATCH_FIELDS}
+    # only the certification names are useful for matching
+    compact["certifications"] = [
+        cert.get("name") if isinstance(cert, dict) else cert
+        for cert in compact.get("certifications") or []
+    ]
+    return _clean(compact)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def fit_json(value, budget):
+    """
+    Shortens the lists in a JSON value until it fits a token budget
+
+    The longest list loses its last item first, so every field keeps its
+    most important entries for as long as possible.
+
+    :param value: dict or list
+    :param budget: maximum number of tokens of the serialized value
+    :return: JSON string
+    """
+    text = _dumps(value)
+    while estimate_tokens(text) > budget:
+        lists = []
+
+        def collect(node):
+            if isinstance(node, list):
+                if node:
+                    lists.append(node)
+                for item in node:
+                    collect(item)
+            elif isinstance(node, dict):
+                for item in node.values():
+                    collect(item)
+
+        collect(value)
+        if not lists:
+            return trim_to_budget(text, budget)
+        max(lists, key=lambda node: len(_dumps(node))).pop()
+        text = _dumps(value)
+    return text
+
+
+# minimal shape checks for the answers, see llm_json.validate()
+CAREER_INSIGHTS_SCHEMA = {
+    "required": ["roleOverview"],
+    "properties": {
+        "roleOverview": str,
+        "technicalSkills": list,
+        "softSkills": list,
+        "certifications": list,
+        "projectIdeas": list,
+        "industryTrends": list,
+        "salaryRange": dict,
+        "learningResources": list,
+        "prerequisites": dict,
+        "careerPath": dict,
+    },
+}
+RESUME_PARSE_SCHEMA = {
+    "required": ["skills"],
+    "properties": {"skills": list, "experience": list, "education": list, "certifications": list},
+}
+COMPARISON_SCHEMA = {
+    "required": ["overallMatch"],
+    "properties": {
+        "overallMatch": (int, float, str),
+        "matchingSkills": list,
+        "missingSkills": list,
+        "recommendations": list,
+    },
+}
+
+
+def career_guide_structure(job_title):
+    """
+    Builds the JSON structure a career guide answer must follow
+
+    :param job_title: job title the guide is for
+    :return: string
+    """
+    return f"""{{
+        "roleOverview": "Detailed description specific to {job_title}, including day-to-day responsibilities, career progression, and industry impact",
+
+        "technicalSkills": [
+            {{
+                "category": "Core Skills for {job_title}",
+                "tools": ["List specific tools and technologies required"]
+            }},
+            {{
+                "category": "Additional Technical Skills",
+                "tools": ["List complementary skills that would be valuable"]
+            }},
+            {{
+                "category": "Emerging Technologies",
+                "tools": ["List new technologies relevant to this role"]
+            }}
+        ],
+
+        "softSkills": [
+            "List 5-7 soft skills specifically important for {job_title}, with brief explanations"
+        ],
+
+        "certifications": [
+            {{
+                "name": "Certification name specific to {job_title}",
+                "provider": "Certification provider",
+                "level": "Difficulty level",
+                "description": "Why this certification is valuable for {job_title}"
+            }}
+        ],
+
+        "projectIdeas": [
+            {{
+                "title": "Project name relevant to {job_title}",
+                "description": "Detailed project description showing relevant skills",
+                "technologies": ["Required technologies"],
+                "learningOutcomes": ["What you'll learn from this project"]
+            }}
+        ],
+
+        "industryTrends": [
+            "List 5 current trends specifically affecting {job_title} roles"
+        ],
+
+        "salaryRange": {{
+            "entry": "Entry-level salary range for {job_title}",
+            "mid": "Mid-level salary range for {job_title}",
+            "senior": "Senior-level salary range for {job_title}",
+            "factors": ["List factors that affect salary in this role"]
+        }},
+
+        "learningResources": [
+            {{
+                "name": "Resource name specific to {job_title}",
+                "type": "Course/Book/Tutorial/Workshop",
+                "cost": "Free/Paid with approximate cost",
+                "url": "Resource URL",
+                "duration": "Estimated time to complete",
+                "description": "What you'll learn from this resource"
+            }}
+        ],
+
+        "prerequisites": {{
+            "education": ["Required/recommended education"],
+            "experience": ["Required/recommended experience"],
+            "skills": ["Must-have skills before starting"]
+        }},
+
+        "careerPath": {{
+            "entryLevel": "Entry-level positions",
+            "midLevel": "Mid-level positions",
+            "senior": "Senior-level positions",
+            "advancement": ["Possible career advancement paths"]
+        }}
+    }}"""
+
+
+def career_insights_prompt(job_title):
+    """
+    Builds the career guide prompt for a job title
+
+    :param job_title: job title searched by the user
+    :return: string
+    """
+    return f"""
+    Create a comprehensive career guide for a {job_title} role. Be specific to this role and provide detailed, practical information.
+
+    Return a JSON object with the following structure:
+    {career_guide_structure(job_title)}
+
+    Ensure all information is:
+    1. Specific to the {job_title} role
+    2. Current and industry-relevant
+    3. Detailed and actionable
+    4. Realistic and practical
+    """
+
+
+def career_insights_batch_prompt(job_titles):
+    """
+    Builds one prompt asking for the career guides of several job titles
+
+    :param job_titles: list of job titles
+    :return: string
+    """
+    return f"""
+    Create a comprehensive career guide for each of these roles: {json.dumps(job_titles)}. Be specific to each role and provide detailed, practical information.
+
+    Return a JSON object whose keys are exactly these job titles. The value for each title is a JSON object with the following structure, where ROLE stands for that job title:
+    {career_guide_structure("ROLE")}
+
+    Ensure all information is:
+    1. Specific to each role
+    2. Current and industry-relevant
+    3. Detailed and actionable
+    4. Realistic and practical
+    """
+
+
+def resume_parse_prompt(text):
+    """
+    Builds the prompt that structures extracted resume text
+
+    :param text: plain text of the resume
+    :return: string
+    """
+    text = trim_to_budget(normalize_text(text), _budgets["resume"])
+    return f"""
+    Parse this resume text and extract key information in JSON format. Enter pure JSON without any extra characters or pretty formatting:
+    {text}
+
+    Return format:
+    {{
+        "skills": ["skill1", "skill2"],
+        "experience": ["exp1", "exp2"],
+        "education": ["edu1", "edu2"],
+        "certifications": ["cert1", "cert2"]
+    }}
+    """
+
+
+def comparison_prompt(resume, job_insights):
+    """
+    Builds the prompt comparing a parsed resume with the career insights of a job
+
+    :param resume: parsed resume dict
+    :param job_insights: career insights dict returned by /fake-job
+    :return: string
+    """
+    # the resume gets a bit more of the budget, it is what is being judged
+    resume_budget = _budgets["comparison"] * 3 // 5
+    resume_json = fit_json(compact_resume(resume), resume_budget)
+    insights_json = fit_json(compact_insights(job_insights), _budgets["comparison"] - estimate_tokens(resume_json))
+    return f"""
+    Compare this resume with the job requirements and provide a detailed analysis:
+    Resume: {resume_json}
+    Job Requirements: {insights_json}
+
+    Return a JSON object with the following structure:
+    {{
+        "overallMatch": percentage,
+        "matchingSkills": ["skill1", "skill2", ...],
+        "missingSkills": ["skill1", "skill2", ...],
+        "recommendations": ["rec1", "rec2", ...]
+    }}
+    """
@@ -0,0 +1,145 @@
+"""
+Bulk re-parsing of the resumes stored in GridFS
+
+Used by the ``flask reparse-resumes`` command whenever the parse prompt or the
+PDF extraction changes, so existing users get fresh structured resume data
+without having to search again.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+
+class ReparseStats:
+    """
+    Counters for a reparse run, safe to update from worker threads
+    """
+
+    def __init__(self, skipped=0):
+        self.started = time.monotonic()
+        self.parsed = 0
+        self.failed = 0
+        self.skipped = skipped
+        self.lock = threading.Lock()
+
+    def record(self, ok):
+        """
+        Counts one finished resume
+
+        :param ok: whether the resume was parsed and saved
+        :return: number of resumes finished so far
+        """
+        with self.lock:
+            if ok:
+                self.parsed += 1
+            else:
+                self.failed += 1
+            return self.parsed + self.failed
+
+    def skip(self):
+        """
+        Counts one resume that did not need parsing (checkpointed or empty)
+        """
+        with self.lock:
+            self.skipped += 1
+
+    def summary(self):
+        """
+        Returns a one line progress report
+
+        :return: string
+        """
+        with self.lock:
+            parsed, failed, skipped = self.parsed, self.failed, self.skipped
+        elapsed = time.monotonic() - self.started
+        throughput = (parsed + failed) / elapsed if elapsed > 0 else 0.0
+        return (
+            f"parsed {parsed}, failed {failed}, skipped {skipped} "
+            f"in {elapsed:.1f}s ({throughput:.2f} resumes/s)"
+        )
+
+
+def load_checkpoint(path):
+    """
+    Reads the ids of the users already handled by a previous run
+
+    :param path: checkpoint file, one user id per line
+    :return: set of user ids
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {int(line) for line in f if line.strip()}
+
+
+def run(users, extract, parse, save, checkpoint_path, workers=8, llm_concurrency=4,
+        restart=False, report=print, report_every=25):
+    """
+    Extracts and parses every resume in ``users`` with a bounded worker pool
+
+    Users are streamed and at most ``workers * 2`` of them are queued or in
+    progress at a time. Reading and extraction run on all workers; only the
+    ``parse`` calls are limited to ``llm_concurrency``, so extraction of the
+    next resumes overlaps the LLM calls.
+    Read, extraction and parse errors are counted per user; empty resumes are
+    counted as skipped. Each successfully saved user id is appended to the checkpoint file, so
+    an interrupted run picks up where it stopped. Failed users are not
+    checkpointed and are retried by the next run.
+
+    :param users: iterable of user documents with ``id`` and ``resume``
+    :param extract: callable turning a PDF file object into text
+    :param parse: callable turning resume text into structured data (calls the LLM)
+    :param save: callable storing the structured data for a user id
+    :param checkpoint_path: file recording finished user ids
+    :param workers: number of resumes processed in parallel
+    :param llm_concurrency: maximum number of ``parse`` calls in flight
+    :param restart: ignore and truncate an existing checkpoint
+    :param report: callable receiving progress lines
+    :param report_every: emit a progress line after this many resumes
+    :return: ReparseStats
+    """
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    finished = load_checkpoint(checkpoint_path)
+
+    stats = ReparseStats()
+    llm_slots = threading.BoundedSemaphore(llm_concurrency)
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    checkpoint_lock = threading.Lock()
+
+    with open(checkpoint_path, "a") as checkpoint:
+
+        def handle(user):
+            done = None
+            try:
+                resume_bytes = user.resume.read()
+                if not resume_bytes:
+                    stats.skip()
+                    return
+                text = extract(BytesIO(resume_bytes))
+                with llm_slots:
+                    parsed_resume = parse(text)
+                save(user.id, parsed_resume)
+                with checkpoint_lock:
+                    checkpoint.write(f"{user.id}\n")
+                    checkpoint.flush()
+                done = stats.record(True)
+            except Exception as e:
+                print(f"Error reparsing resume of user {user.id}: {str(e)}")
+                done = stats.record(False)
+            finally:
+                in_flight.release()
+                if done is not None and done % report_every == 0:
+                    report(stats.summary())
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for user in users:
+                if user.id in finished:
+                    stats.skip()
+                    continue
+                in_flight.acquire()
+                pool.submit(handle, user)
+
+    return stats
@@ -0,0 +1,129 @@
+"""
+Local resume parser for cleanly formatted resumes
+
+Section headers (Skills, Experience, Education, Certifications, ...) are
+detected line by line and the lines under each header are turned into the
+same JSON structure Gemini returns for /parse-resume. A confidence score
+says how complete the result looks; only resumes below
+RESUME_LOCAL_PARSE_MIN_CONFIDENCE are sent to Gemini.
+"""
+import re
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+SECTION_HEADERS = {
+    "skills": r"(technical |key |core )?skills( & tools| and tools| summary)?|core competencies|technologies"
+              r"|tech(nical)? stack|tools",
+    "experience": r"(professional |work |relevant )?experience|work history|employment( history)?",
+    "education": r"education( & training| and training)?|academic background|academics",
+    "certifications": r"certifications?( & licenses| and licenses)?|licenses|certificates",
+    # recognised only so their lines do not end up in another section
+    "other": r"projects?|personal projects|summary|profile|objective|about me|awards|honors|publications"
+             r"|interests|hobbies|languages|volunteer(ing)?( experience)?|activities|references|contact",
+}
+_HEADER_RES = {
+    section: re.compile(r"^(" + pattern + r")\s*:?$", re.IGNORECASE) for section, pattern in SECTION_HEADERS.items()
+}
+_BULLET_RE = re.compile(r"^[•▪●‣⁃∙*\-–—>o]\s+")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_RE = re.compile(r"(\+?\d[\d\s().-]{8,}\d)")
+_SKILL_SPLIT_RE = re.compile(r"\s*[,;|•·/]\s*")
+
+_settings = {"min_confidence": DEFAULT_MIN_CONFIDENCE}
+
+
+def configure(info):
+    """
+    Reads RESUME_LOCAL_PARSE_MIN_CONFIDENCE from application.yml
+
+    :param info: dict loaded from application.yml
+    """
+    _settings["min_confidence"] = float((info or {}).get("RESUME_LOCAL_PARSE_MIN_CONFIDENCE",
+                                                        DEFAULT_MIN_CONFIDENCE))
+
+
+def min_confidence():
+    """
+    Returns the confidence a local parse needs to be used instead of Gemini
+
+    :return: float between 0 and 1 (above 1 disables the local parser)
+    """
+    return _settings["min_confidence"]
+
+
+def _header(line):
+    if len(line) > 40:
+        return None
+    for section, header_re in _HEADER_RES.items():
+        if header_re.match(line):
+            return section
+    return None
+
+
+def split_sections(text):
+    """
+    Groups the lines of a resume under the section header they follow
+
+    :param text: plain resume text
+    :return: dict of section name -> list of lines (lines before the first header are under "contact")
+    """
+    sections = {"contact": []}
+    current = "contact"
+    for raw in (text or "").splitlines():
+        line = " ".join(raw.split())
+        if not line:
+            continue
+        section = _header(line)
+        if section is not None:
+            current = section
+            sections.setdefault(current, [])
+            continue
+        sections[current].append(line)
+    return sections
+
+
+def _skills(lines):
+    skills = []
+    seen = set()
+    for line in lines:
+        line = _BULLET_RE.sub("", line)
+        # "Languages: Python, Java" -> "Python, Java"
+        if ":" in line:
+            line = line.split(":", 1)[1]
+        for skill in _SKILL_SPLIT_RE.split(line):
+            skill = skill.strip(" .")
+            if skill and len(skill) <= 40 and skill.lower() not in seen:
+                seen.add(skill.lower())
+                skills.append(skill)
+    return skills
+
+
+def _entries(lines):
+    # bullet points describe the entry above them; the entries are the other lines
+    return [line for line in lines if not _BULLET_RE.match(line)]
+
+
+def parse(text):
+    """
+    Parses a resume locally
+
+    :param text: plain resume text
+    :return: (dict with skills, experience, education and certifications, confidence between 0 and 1)
+    """
+    sections = split_sections(text)
+    parsed = {
+        "skills": _skills(sections.get("skills", [])),
+        "experience": _entries(sections.get("experience", [])),
+        "education": _entries(sections.get("education", [])),
+        "certifications": [_BULLET_RE.sub("", line) for line in sections.get("certifications", [])],
+    }
+    contact = " ".join(sections["contact"])
+    has_contact = bool(_EMAIL_RE.search(contact) or _PHONE_RE.search(contact))
+
+    confidence = (
+        0.35 * min(1.0, len(parsed["skills"]) / 3)
+        + 0.3 * (1.0 if parsed["experience"] else 0.0)
+        + 0.25 * (1.0 if parsed["education"] else 0.0)
+        + 0.1 * (1.0 if has_contact else 0.0)
+    )
+    return parsed, round(confidence, 2)
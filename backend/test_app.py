@@ -2,6 +2,9 @@
 Test module for the backend. This requires setting up repository secrets. Check the documentation on testing for more details...
 """
 import hashlib
+import threading
+import time
+import uuid
 from io import BytesIO
 
 import pytest
@@ -9,7 +12,24 @@ import json
 import datetime
 from flask_mongoengine import MongoEngine
 import yaml
-from app import create_app, Users, SharedJobs
+from app import (
+    create_app, Users, SharedJobs, Analyses, AnalysisParts, AnalyticsSnapshots, popular_job_titles,
+    rebuild_application_stats, refresh_analytics, generate_career_insights_batch, store_analysis_part,
+    collect_analysis_parts, change_application, update_applications,
+)
+import analytics
+import llm_batch
+import llm_cache
+import llm_client
+import llm_json
+import llm_ratelimit
+import llm_resilience
+import llm_telemetry
+import local_match
+import prompts
+import reparse
+import resume_parser
+import warmup
 from unittest.mock import patch, MagicMock
 
 # Make sure to add the .yml and .env to repository secrets in order for the CI to run these tests
@@ -44,6 +64,17 @@ def client():
     db.disconnect()
 
 
+@pytest.fixture(autouse=True)
+def llm_limits_db(tmp_path, monkeypatch):
+    """
+    Gives every test its own Gemini rate limit store
+
+    :param tmp_path: pytest temporary directory
+    :param monkeypatch: pytest monkeypatch
+    """
+    monkeypatch.setattr("llm_ratelimit.DEFAULT_DB_PATH", str(tmp_path / "llm-limits.sqlite"))
+
+
 @pytest.fixture
 def user(client):
     """
@@ -56,14 +87,12 @@ def user(client):
     data = {"username": "testUser", "password": "test", "fullName": "fullName"}
 
     user = Users.objects(username=data["username"])
-    user.first()["applications"] = []
-    user.first().save()
+    user.update_one(set__applications=[], unset__applicationStats=True)
     rv = client.post("/users/login", json=data)
     jdata = json.loads(rv.data.decode("utf-8"))
     header = {"Authorization": "Bearer " + jdata["token"]}
     yield user.first(), header
-    user.first()["applications"] = []
-    user.first().save()
+    user.update_one(set__applications=[], unset__applicationStats=True)
 
 
 """
@@ -450,7 +479,7 @@ def test_fake_job_description(client, mocker):
     
     # Mock the genai configuration and model
     mock_genai = MagicMock()
-    mocker.patch("app.genai", mock_genai)
+    mocker.patch("llm_client.genai", mock_genai)
     
     mock_model = MagicMock()
     mock_response = MagicMock()
@@ -546,7 +575,7 @@ def test_parse_resume(client, mocker):
     
     # Mock the genai configuration and model
     mock_genai = MagicMock()
-    mocker.patch("app.genai", mock_genai)
+    mocker.patch("llm_client.genai", mock_genai)
     
     mock_model = MagicMock()
     mock_response = MagicMock()
@@ -597,7 +626,7 @@ def test_compare_resume(client, mocker):
     
     # Mock the genai configuration and model
     mock_genai = MagicMock()
-    mocker.patch("app.genai", mock_genai)
+    mocker.patch("llm_client.genai", mock_genai)
     
     mock_model = MagicMock()
     mock_response = MagicMock()
@@ -1330,3 +1359,1217 @@ def test_resume_upload_invalid(client, user):
     result = json.loads(rv.data.decode("utf-8"))
     assert "error" in result
     assert result["error"] == "No resume file found in the input"
+
+
+# Test the bulk resume reparse resumes from its checkpoint
+def test_reparse_resumes_checkpoint(tmp_path):
+    """
+    Tests that the reparse run skips checkpointed and empty resumes, counts read errors and checkpoints the rest,
+    extracting resumes while another one is being parsed
+
+    :param tmp_path: pytest temporary directory
+    """
+    checkpoint = tmp_path / "checkpoint.txt"
+    checkpoint.write_text("1\n")
+
+    users = []
+    for user_id in (1, 2, 3, 4, 5):
+        user_doc = MagicMock()
+        user_doc.id = user_id
+        user_doc.resume.read.return_value = b"%PDF resume"
+        users.append(user_doc)
+    users[3].resume.read.return_value = b""
+    users[4].resume.read.side_effect = IOError("GridFS chunk missing")
+
+    # with a single LLM slot, the second resume is still extracted while the first is parsed
+    extracted = []
+    both_extracted = threading.Event()
+
+    def extract(f):
+        extracted.append(f)
+        if len(extracted) == 2:
+            both_extracted.set()
+        return "resume text"
+
+    def parse(text):
+        assert both_extracted.wait(5)
+        return {"skills": [text]}
+
+    saved = {}
+    stats = reparse.run(
+        users,
+        extract=extract,
+        parse=parse,
+        save=lambda user_id, parsed: saved.update({user_id: parsed}),
+        checkpoint_path=str(checkpoint),
+        workers=2,
+        llm_concurrency=1,
+        report=lambda line: None,
+    )
+
+    assert stats.parsed == 2
+    assert stats.skipped == 2
+    assert stats.failed == 1
+    assert sorted(saved) == [2, 3]
+    assert reparse.load_checkpoint(str(checkpoint)) == {1, 2, 3}
+
+
+# Test that the Gemini client is built once and reused across requests
+def test_llm_client_reused(client, mocker):
+    """
+    Tests that repeated LLM requests share one configured model
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value.text = '{"overallMatch": 50}'
+    mock_genai.GenerativeModel.return_value = mock_model
+
+    for i in range(3):
+        test_data = {"resume": {"skills": [f"Python {i}"]}, "jobInsights": {"roleOverview": "Developer"}}
+        rv = client.post("/compare-resume", json=test_data)
+        assert rv.status_code == 200
+
+    mock_genai.configure.assert_called_once_with(api_key="fake-api-key")
+    assert mock_genai.GenerativeModel.call_count == 1
+    assert mock_model.generate_content.call_count == 3
+
+
+# Test that career insights are served from the cache for repeated titles
+def test_fake_job_cached(client, mocker):
+    """
+    Tests that the same (normalized) job title only calls Gemini once
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value.text = '{"roleOverview": "Cached overview"}'
+    mock_genai.GenerativeModel.return_value = mock_model
+
+    rv = client.get("/fake-job?keywords=Software%20Engineer")
+    assert rv.status_code == 200
+    assert rv.headers["X-Cache"] == "miss"
+
+    rv = client.get("/fake-job?keywords=%20software%20%20engineer")
+    assert rv.status_code == 200
+    assert rv.headers["X-Cache"] == "hit"
+    assert json.loads(rv.data.decode("utf-8"))["roleOverview"] == "Cached overview"
+    assert mock_model.generate_content.call_count == 1
+
+
+# Test stale-while-revalidate behaviour of the TTL cache
+def test_ttl_cache_serves_stale_while_refreshing():
+    """
+    Tests that a stale entry is returned at once and refreshed in the background
+    """
+    now = [0]
+    cache = llm_cache.TTLCache(10, stale_ttl=100, clock=lambda: now[0])
+    assert cache.get_or_compute("key", lambda: "v1") == ("v1", "miss")
+
+    now[0] = 50
+    mock_thread = MagicMock()
+    with patch("llm_cache.threading.Thread", mock_thread):
+        assert cache.get_or_compute("key", lambda: "v2") == ("v1", "stale")
+    refresh = mock_thread.call_args.kwargs["target"]
+    refresh()
+    assert cache.get_or_compute("key", lambda: "v3") == ("v2", "hit")
+
+    now[0] = 500
+    assert cache.get_or_compute("key", lambda: "v4") == ("v4", "miss")
+
+
+# Test that concurrent identical calls share one upstream request
+def test_single_flight_coalesces_concurrent_calls():
+    """
+    Tests that waiters share the leader's result and each get their own error
+    """
+    import threading
+
+    flights = llm_cache.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "shared"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", upstream)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.in_flight() == 0:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == "shared" for result, _ in results)
+
+    def failing():
+        raise ValueError("upstream failed")
+
+    with pytest.raises(ValueError):
+        flights.do("key", failing)
+    assert flights.in_flight() == 0
+
+
+# Test that repeated comparisons are served from the cache
+def test_compare_resume_cached(client, mocker):
+    """
+    Tests that the same resume and insights, in any key order, only call Gemini once
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value.text = '{"overallMatch": 80}'
+    mock_genai.GenerativeModel.return_value = mock_model
+
+    rv = client.post("/compare-resume", json={
+        "resume": {"skills": ["Python"], "education": ["BS"]},
+        "jobInsights": {"roleOverview": "Developer"},
+    })
+    assert rv.headers["X-Cache"] == "miss"
+
+    rv = client.post("/compare-resume", json={
+        "jobInsights": {"roleOverview": "Developer"},
+        "resume": {"education": ["BS"], "skills": ["Python"]},
+    })
+    assert rv.status_code == 200
+    assert rv.headers["X-Cache"] == "hit"
+    assert json.loads(rv.data.decode("utf-8"))["overallMatch"] == 80
+    assert mock_model.generate_content.call_count == 1
+
+
+# Test the combined analyze pipeline
+def test_analyze(client, mocker, user):
+    """
+    Tests that /analyze parses the stored resume, compares it and saves the analysis
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    :param user: the test user object
+    """
+    user_obj, header = user
+    rv = client.post(
+        "/resume", headers=header, content_type="multipart/form-data",
+        data={"file": (BytesIO(b"%PDF stored resume"), "resume.pdf")},
+    )
+    assert rv.status_code == 200
+
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_reader = MagicMock()
+    mock_reader.pages[0].extract_text.return_value = "Python developer"
+    mock_reader.pages.__iter__.return_value = [mock_reader.pages[0]]
+    mocker.patch("app.PdfReader", return_value=mock_reader)
+
+    def fake_generate(prompt, **kwargs):
+        response = MagicMock()
+        if "Parse this resume" in prompt:
+            response.text = '{"skills": ["Python"]}'
+        elif "career guide" in prompt:
+            response.text = '{"roleOverview": "Analyze overview"}'
+        else:
+            response.text = '{"overallMatch": 64}'
+        return response
+
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_genai.GenerativeModel.return_value.generate_content.side_effect = fake_generate
+
+    analyses_before = Analyses.objects(userId=user_obj.id).count()
+    rv = client.get("/analyze?keywords=Data%20Engineer", headers=header)
+
+    assert rv.status_code == 200
+    result = json.loads(rv.data.decode("utf-8"))
+    assert result["resume"] == {"skills": ["Python"]}
+    assert result["insights"]["roleOverview"] == "Analyze overview"
+    assert result["comparison"]["overallMatch"] == 64
+    assert result["analysis"]["searchTerm"] == "Data Engineer"
+    assert Analyses.objects(userId=user_obj.id).count() == analyses_before + 1
+
+
+# Test that analyze requires authorization
+def test_analyze_unauthorized(client):
+    """
+    Tests that /analyze rejects requests without a token
+
+    :param client: mongodb client
+    """
+    rv = client.get("/analyze?keywords=Data%20Engineer")
+    assert rv.status_code == 401
+
+
+# Test submitting an LLM job and fetching its result
+def test_llm_job_submit_and_poll(client, mocker, user):
+    """
+    Tests that /llm-jobs returns a job id at once and the result can be polled and streamed
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    :param user: the test user object
+    """
+    _, header = user
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_genai.GenerativeModel.return_value.generate_content.return_value.text = '{"roleOverview": "Queued overview"}'
+
+    rv = client.post("/llm-jobs", headers=header, json={"kind": "career-insights", "keywords": "Tester"})
+    assert rv.status_code == 202
+    job_id = json.loads(rv.data.decode("utf-8"))["jobId"]
+
+    rv = client.get(f"/llm-jobs/{job_id}/stream", headers=header)
+    assert rv.mimetype == "text/event-stream"
+    assert "event: result" in rv.get_data(as_text=True)
+
+    rv = client.get(f"/llm-jobs/{job_id}", headers=header)
+    result = json.loads(rv.data.decode("utf-8"))
+    assert result["status"] == "done"
+    assert result["result"]["roleOverview"] == "Queued overview"
+
+    # jobs are only visible to the user who submitted them
+    assert client.get(f"/llm-jobs/{job_id}").status_code == 401
+    other_token = "424242.other-user-token"
+    expiry = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%m/%d/%Y, %H:%M:%S")
+    Users(id=424242, username="otherLlmJobUser", authTokens=[{"token": other_token, "expiry": expiry}]).save()
+    try:
+        other_header = {"Authorization": "Bearer " + other_token}
+        assert client.get(f"/llm-jobs/{job_id}", headers=other_header).status_code == 404
+        assert client.get(f"/llm-jobs/{job_id}/stream", headers=other_header).status_code == 404
+    finally:
+        Users.objects(id=424242).delete()
+
+    stats = json.loads(client.get("/llm-jobs/stats", headers=header).data.decode("utf-8"))
+    assert stats["completed"] == 1
+    assert stats["queued"] == 0
+
+
+# Test LLM job validation
+def test_llm_job_unknown_kind(client, user):
+    """
+    Tests that unknown job kinds and unknown job ids are rejected
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    _, header = user
+    rv = client.post("/llm-jobs", headers=header, json={"kind": "nope"})
+    assert rv.status_code == 400
+    rv = client.get("/llm-jobs/does-not-exist", headers=header)
+    assert rv.status_code == 404
+
+
+# Test streaming career insights over Server-Sent Events
+def test_fake_job_stream(client, mocker):
+    """
+    Tests that ?stream=1 forwards Gemini chunks and ends with the parsed JSON
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    chunks = []
+    for text in ('```json\n{"roleOverview": ', '"Streamed overview"}', '\n```'):
+        chunk = MagicMock()
+        chunk.text = text
+        chunks.append(chunk)
+    mock_genai.GenerativeModel.return_value.generate_content.return_value = chunks
+
+    rv = client.get("/fake-job?keywords=Streamer&stream=1")
+    assert rv.mimetype == "text/event-stream"
+    body = rv.get_data(as_text=True)
+    assert body.count("event: chunk") == 3
+    assert 'event: result\ndata: {"roleOverview": "Streamed overview"}' in body
+
+    # the streamed answer is cached for the next request
+    rv = client.get("/fake-job?keywords=Streamer&stream=1")
+    assert rv.get_data(as_text=True).startswith("event: result")
+
+
+# Test the shared Gemini rate limiter
+def test_rate_limiter_tokens_and_concurrency(tmp_path):
+    """
+    Tests that the limiter enforces its burst and in-flight cap and reports Retry-After
+
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = str(tmp_path / "limits.sqlite")
+    limiter = llm_ratelimit.RateLimiter(6, max_in_flight=1, burst=2, queue_timeout=0, db_path=db_path)
+
+    lease = limiter.acquire()
+    with pytest.raises(llm_ratelimit.RateLimitedError):
+        limiter.acquire()  # in-flight cap reached
+    limiter.release(lease)
+
+    # a second limiter on the same file shares the bucket, like another worker process
+    other_worker = llm_ratelimit.RateLimiter(6, max_in_flight=1, burst=2, queue_timeout=0, db_path=db_path)
+    other_worker.release(other_worker.acquire())
+    with pytest.raises(llm_ratelimit.RateLimitedError) as err:
+        limiter.acquire()  # both burst tokens spent
+    assert err.value.retry_after >= 1
+
+
+# Test that a rate limited LLM call turns into a 429
+def test_fake_job_rate_limited(client, mocker):
+    """
+    Tests that /fake-job answers 429 with Retry-After when Gemini is rate limited
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mocker.patch("llm_client.genai", MagicMock())
+    mocker.patch("app.generate_career_insights", side_effect=llm_ratelimit.RateLimitedError(7))
+
+    rv = client.get("/fake-job?keywords=Busy%20Role")
+    assert rv.status_code == 429
+    assert rv.headers["Retry-After"] == "7"
+
+
+# Test retries, deadlines and the circuit breaker around LLM calls
+def test_resilient_caller_retries_and_breaker(mocker):
+    """
+    Tests that transient errors are retried and repeated failures open the breaker
+
+    :param mocker: pytest mocker
+    """
+    from google.api_core import exceptions as google_exceptions
+
+    mocker.patch("llm_resilience.time.sleep")
+    caller = llm_resilience.ResilientCaller(
+        deadline=5, max_retries=2, base_delay=0.01,
+        breaker=llm_resilience.CircuitBreaker(failure_threshold=3, reset_timeout=60),
+    )
+
+    upstream = MagicMock(side_effect=[google_exceptions.ServiceUnavailable("busy"), "answer"])
+    assert caller.call(upstream) == ("answer", 1)
+
+    upstream = MagicMock(side_effect=google_exceptions.ServiceUnavailable("down"))
+    with pytest.raises(llm_resilience.LLMUpstreamError):
+        caller.call(upstream)
+    assert caller.breaker.state == "open"
+
+    upstream = MagicMock(return_value="never called")
+    with pytest.raises(llm_resilience.CircuitOpenError):
+        caller.call(upstream)
+    upstream.assert_not_called()
+
+    # errors that are not retryable are raised at once
+    caller.breaker.record_success()
+    upstream = MagicMock(side_effect=ValueError("bad request"))
+    with pytest.raises(ValueError):
+        caller.call(upstream)
+    assert upstream.call_count == 1
+
+
+# Test that a dropped stream does not leave the breaker stuck open
+def test_stream_disconnect_releases_breaker_trial():
+    """
+    Tests that closing a streaming trial call early frees the half-open breaker for the next caller
+    """
+    now = [0.0]
+    breaker = llm_resilience.CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 20.0
+    model = MagicMock()
+    model.generate_content.return_value = iter([MagicMock(parts=["a"], text="first"),
+                                                MagicMock(parts=["b"], text="second")])
+    llm = llm_client.LLMClient(model, resilience=llm_resilience.ResilientCaller(breaker=breaker))
+
+    stream = llm.generate_stream("prompt")
+    assert next(stream) == "first"
+    stream.close()  # the client went away mid-stream
+
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+# Test that waiting for a rate limiter slot neither eats the deadline nor trips the breaker
+def test_rate_limiter_wait_outside_deadline(tmp_path):
+    """
+    Tests that the limiter queue is waited on before the deadline starts and a full queue is a 429, not a failure
+
+    :param tmp_path: pytest temporary directory
+    """
+    import threading
+
+    limiter = llm_ratelimit.RateLimiter(600, max_in_flight=1, queue_timeout=2, db_path=str(tmp_path / "limits.sqlite"))
+    breaker = llm_resilience.CircuitBreaker(failure_threshold=1)
+    model = MagicMock()
+    model.generate_content.return_value.text = "answer"
+    llm = llm_client.LLMClient(model, limiter=limiter,
+                               resilience=llm_resilience.ResilientCaller(deadline=0.2, breaker=breaker))
+
+    lease = limiter.acquire()
+    threading.Timer(0.5, limiter.release, args=(lease,)).start()
+    assert llm.generate("queued longer than the deadline") == "answer"
+
+    limiter.queue_timeout = 0
+    lease = limiter.acquire()
+    with pytest.raises(llm_ratelimit.RateLimitedError):
+        llm.generate("queue full")
+    limiter.release(lease)
+    assert breaker.failures == 0
+    assert breaker.state == "closed"
+
+
+# Test the per-call deadline and hedged requests
+def test_resilient_caller_deadline_and_hedge():
+    """
+    Tests that slow calls hit the deadline and that a hedge races a slow first request
+    """
+    import threading
+
+    caller = llm_resilience.ResilientCaller(deadline=0.2, max_retries=0)
+    release = threading.Event()
+    with pytest.raises(llm_resilience.LLMDeadlineExceededError):
+        caller.call(lambda timeout: release.wait(5))
+    release.set()
+
+    caller = llm_resilience.ResilientCaller(deadline=5, hedge_percentile=50)
+    for _ in range(20):
+        caller.latencies.record(0.01)
+    calls = []
+
+    def first_slow(timeout):
+        calls.append(1)
+        if len(calls) == 1:
+            threading.Event().wait(2)
+            return "slow"
+        return "hedged"
+
+    assert caller.call(first_slow) == ("hedged", 0)
+
+
+# Test that expired answers are served while Gemini is unavailable
+def test_ttl_cache_fallback_on_upstream_error():
+    """
+    Tests that an expired entry is returned when the refresh fails with an upstream error
+    """
+    now = [0]
+    cache = llm_cache.TTLCache(10, fallback_errors=(llm_resilience.LLMUnavailableError,), clock=lambda: now[0])
+    cache.set("key", "old answer")
+    now[0] = 100
+
+    def unavailable():
+        raise llm_resilience.CircuitOpenError("down")
+
+    assert cache.get_or_compute("key", unavailable) == ("old answer", "fallback")
+    with pytest.raises(llm_resilience.CircuitOpenError):
+        cache.get_or_compute("other", unavailable)
+
+
+# Test local repair of malformed Gemini answers
+def test_llm_json_repairs_common_defects():
+    """
+    Tests that fenced, chatty and slightly broken answers are parsed without asking Gemini again
+    """
+    reask = MagicMock()
+    answer = 'Sure! Here it is:\n```json\n{"skills": ["Python", "SQL",], "remote": True, // note\n"education": ["BS"'
+    result = llm_json.loads(answer, {"required": ["skills"], "properties": {"skills": list}}, reask=reask)
+    assert result == {"skills": ["Python", "SQL"], "remote": True, "education": ["BS"]}
+    reask.assert_not_called()
+
+    assert llm_json.extract_object('prefix {"a": "}", "b": {"c": 1}} suffix') == '{"a": "}", "b": {"c": 1}}'
+
+
+# Test that Gemini is asked only once to fix an answer
+def test_llm_json_reasks_once(client, mocker):
+    """
+    Tests that an unusable answer triggers exactly one repair request
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_model = mock_genai.GenerativeModel.return_value
+    answers = iter(['{"overview": "wrong key"}', '{"roleOverview": "Fixed overview"}'])
+    mock_model.generate_content.side_effect = lambda *args, **kwargs: MagicMock(text=next(answers))
+
+    rv = client.get("/fake-job?keywords=Reasked")
+    assert rv.status_code == 200
+    assert json.loads(rv.data)["roleOverview"] == "Fixed overview"
+    assert mock_model.generate_content.call_count == 2
+    assert 'missing required key "roleOverview"' in mock_model.generate_content.call_args.args[0]
+    assert mock_genai.GenerativeModel.call_args.kwargs["generation_config"]["response_mime_type"] == "application/json"
+
+    mock_model.generate_content.side_effect = lambda *args, **kwargs: MagicMock(text="not json")
+    rv = client.get("/fake-job?keywords=Still broken")
+    assert rv.status_code == 500
+    assert mock_model.generate_content.call_count == 4
+
+
+# Test prompt compaction and token accounting
+def test_comparison_prompt_compaction(client, mocker):
+    """
+    Tests that comparison prompts only carry matching fields within the token budget and that tokens are counted
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    resume = {"skills": ["Python", " python", "SQL"], "name": "Test User", "education": []}
+    insights = {
+        "roleOverview": "Long overview",
+        "technicalSkills": [{"category": "Core", "tools": ["Tool %d" % i for i in range(1000)]}],
+        "salaryRange": {"entry": "$60k"},
+        "certifications": [{"name": "AWS", "provider": "Amazon"}],
+    }
+    prompt = prompts.comparison_prompt(resume, insights)
+    assert '"skills":["Python","SQL"]' in prompt
+    assert "Test User" not in prompt and "salaryRange" not in prompt and "Long overview" not in prompt
+    assert '"certifications":["AWS"]' in prompt
+    assert prompts.estimate_tokens(prompt) < prompts.DEFAULT_COMPARISON_TOKEN_BUDGET + 200
+    assert prompts.normalize_text("  A   B \n\n\n\n C\t") == "A B\n\nC"
+
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    response = mock_genai.GenerativeModel.return_value.generate_content.return_value
+    response.text = '{"overallMatch": 40}'
+    response.usage_metadata.prompt_token_count = 321
+    response.usage_metadata.candidates_token_count = 12
+
+    rv = client.post("/compare-resume", json={"resume": resume, "jobInsights": insights})
+    assert rv.status_code == 200
+    usage = next(row for row in llm_telemetry.snapshot() if row["endpoint"] == "compare-resume")
+    assert usage["upstreamCalls"] == 1
+    assert usage["inputTokens"]["sum"] == 321 and usage["outputTokens"]["sum"] == 12
+
+
+# Test the offline LLM stub backend
+def test_llm_stub_backend(client):
+    """
+    Tests that the stub backend answers every endpoint with schema-valid JSON and simulates errors
+
+    :param client: mongodb client
+    """
+    llm_client.configure({"LLM_BACKEND": "stub", "LLM_STUB_LATENCY_MS": 0, "GEMINI_RPM": 0})
+
+    rv = client.get("/fake-job?keywords=Data Engineer")
+    assert rv.status_code == 200
+    insights = json.loads(rv.data)
+    assert insights["roleOverview"].startswith("A Data Engineer")
+    assert rv.data == client.get("/fake-job?keywords=Data Engineer&stream=0").data
+
+    tools = insights["technicalSkills"][0]["tools"]
+    rv = client.post("/compare-resume", json={"resume": {"skills": tools[:1]}, "jobInsights": insights})
+    comparison = json.loads(rv.data)
+    assert comparison["matchingSkills"] == tools[:1]
+    assert 0 < comparison["overallMatch"] < 100
+
+    llm_client.configure({
+        "LLM_BACKEND": "stub", "LLM_STUB_LATENCY_MS": 0, "LLM_STUB_ERROR_RATE": 1,
+        "LLM_STUB_ERRORS": {"unavailable": 1}, "GEMINI_RPM": 0, "GEMINI_MAX_RETRIES": 0,
+    })
+    rv = client.get("/fake-job?keywords=Failing Role")
+    assert rv.status_code == 503
+    assert "Retry-After" in rv.headers
+
+
+# Test the per-call LLM telemetry
+def test_llm_stats(client, mocker, user):
+    """
+    Tests that LLM calls and cache hits are aggregated per endpoint with latency, token and error figures
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    :param user: the test user object
+    """
+    _, header = user
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    response = mock_genai.GenerativeModel.return_value.generate_content.return_value
+    response.text = '{"roleOverview": "Telemetry overview"}'
+    response.usage_metadata.prompt_token_count = 700
+    response.usage_metadata.candidates_token_count = 300
+
+    client.get("/fake-job?keywords=Telemetry")
+    client.get("/fake-job?keywords=Telemetry")
+    response.text = "not json"
+    client.get("/fake-job?keywords=Broken")
+
+    assert client.get("/llm-stats").status_code == 401
+    rv = client.get("/llm-stats", headers=header)
+    assert rv.status_code == 200
+    stats = json.loads(rv.data)
+    series = [s for s in stats["calls"] if s["endpoint"] == "career-insights"]
+    assert len(series) == 1
+    insights = series[0]
+    assert insights["model"] == llm_client.DEFAULT_MODEL
+    assert insights["promptVersion"] == prompts.CAREER_INSIGHTS_PROMPT_VERSION
+    assert insights["calls"] == 3
+    assert insights["upstreamCalls"] == 3  # the broken answer was re-asked once
+    assert insights["cache"] == {"miss": 2, "hit": 1}
+    assert insights["errors"] == {"JSONDecodeError": 1}
+    assert insights["inputTokens"]["count"] == 2
+    assert insights["inputTokens"]["sum"] == 700 + 1400
+    assert insights["latencySeconds"]["count"] == 3
+    assert stats["jsonParsing"]["failed"] >= 1
+
+    histogram = llm_telemetry.Histogram((1, 10))
+    for value in (0.5, 2, 3, 50):
+        histogram.observe(value)
+    assert histogram.to_json()["buckets"] == {"1": 1, "10": 2, "+Inf": 1}
+    assert histogram.percentile(50) == 10
+
+
+# Test the background warm-up of popular career insights
+def test_insights_warmup(client, mocker, tmp_path):
+    """
+    Tests that the most applied-to titles are warmed within the LLM budget and fresh entries are skipped
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    :param tmp_path: pytest temporary directory
+    """
+    # the aggregations are mocked so the test neither depends on nor touches the stored jobs and users
+    shared_jobs = mocker.patch("app.SharedJobs.objects")
+    shared_jobs.return_value.aggregate.return_value = [
+        {"_id": "Data Scientist", "count": 5}, {"_id": "Nurse", "count": 1},
+    ]
+    users = mocker.patch("app.Users.objects")
+    users.aggregate.return_value = [
+        {"_id": "software engineer", "count": 1}, {"_id": "Software Engineer", "count": 1},
+        {"_id": "Software  Engineer", "count": 1}, {"_id": "Nurse", "count": 1}, {"_id": None, "count": 4},
+    ]
+    assert popular_job_titles(2) == ["Data Scientist", "Software Engineer"]
+    shared_jobs.assert_called_with(active=1)
+
+    cache = llm_cache.TTLCache(100)
+    compute = MagicMock(side_effect=lambda title: {"roleOverview": title})
+    warmer = warmup.InsightsWarmer(cache, llm_cache.normalize_key, compute,
+                                   lambda: ["Data Scientist", "Software Engineer", "Nurse"], interval=10, budget=2)
+    assert warmer.run_once()["warmed"] == 2
+    assert cache.get("data scientist") == ({"roleOverview": "Data Scientist"}, True)
+
+    result = warmer.run_once()
+    assert (result["warmed"], result["skipped"]) == (1, 2)
+    assert cache.get("nurse")[0] == {"roleOverview": "Nurse"}
+    assert compute.call_count == 3
+
+    # worker processes sharing a limiter spend one budget between them
+    limiter = llm_ratelimit.RateLimiter(2 * 60.0 / 3600, max_in_flight=2, burst=2, queue_timeout=0,
+                                        db_path=str(tmp_path / "limits.sqlite"), name="insights-warmup")
+    compute.reset_mock()
+    workers = [
+        warmup.InsightsWarmer(llm_cache.TTLCache(100), llm_cache.normalize_key, compute,
+                              lambda: ["Data Scientist", "Software Engineer", "Nurse"], interval=3600, budget=2,
+                              limiter=limiter)
+        for _ in range(3)
+    ]
+    assert sum(worker.run_once()["warmed"] for worker in workers) == 2
+    assert compute.call_count == 2
+
+
+# Test micro-batching of career insights
+def test_micro_batched_career_insights(client, mocker):
+    """
+    Tests that titles submitted in the same window share one call and missing guides fall back to single calls
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    import threading
+
+    batches = []
+
+    def run_batch(titles):
+        batches.append(sorted(titles))
+        return {title.lower(): "batched " + title for title in titles if title != "Chef"}
+
+    batcher = llm_batch.MicroBatcher(run_batch, lambda title: "single " + title, window=0.2, max_size=3,
+                                     key=str.lower)
+    results = {}
+
+    def submit(title):
+        results[title] = batcher.submit(title)
+
+    threads = [threading.Thread(target=submit, args=(title,)) for title in ("Nurse", "Chef", "Pilot")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert batches == [["Chef", "Nurse", "Pilot"]]
+    assert results == {"Nurse": "batched Nurse", "Chef": "single Chef", "Pilot": "batched Pilot"}
+    assert batcher.submit("Solo") == "single Solo"
+    assert batcher.stats()["batches"] == 2 and batcher.stats()["fallbacks"] == 1
+
+    # max_size caps every call and a failed call falls back per item
+    sizes = []
+
+    def failing_batch(titles):
+        sizes.append(len(titles))
+        if "Baker" in titles:
+            raise RuntimeError("batch failed")
+        return {title.lower(): "batched " + title for title in titles}
+
+    batcher = llm_batch.MicroBatcher(failing_batch, lambda title: "single " + title, window=0.2, max_size=2,
+                                     key=str.lower)
+    titles = ["Nurse", "Chef", "Pilot", "Baker", "Welder"]
+    results = {}
+    threads = [threading.Thread(target=lambda t=title: results.update({t: batcher.submit(t)})) for title in titles]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == sorted(titles)
+    assert max(sizes) == 2
+    assert batcher.stats()["items"] == len(titles) and batcher.stats()["batches"] == 3
+    assert results["Baker"] == "single Baker"
+    assert all(results[t] in ("batched " + t, "single " + t) for t in titles)
+
+    mocker.patch("os.getenv", return_value="fake-api-key")
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_genai.GenerativeModel.return_value.generate_content.return_value.text = json.dumps({
+        "nurse": {"roleOverview": "Nurse overview"},
+        "Pilot": {"overview": "missing roleOverview"},
+    })
+    llm_telemetry.reset()
+    assert generate_career_insights_batch(["Nurse", "Pilot", "Chef"]) == {"nurse": {"roleOverview": "Nurse overview"}}
+    prompt = mock_genai.GenerativeModel.return_value.generate_content.call_args.args[0]
+    assert '["Nurse", "Pilot", "Chef"]' in prompt
+    # titles answered by the batch still count as career-insights calls, the tokens stay with the batch
+    series = {row["endpoint"]: row for row in llm_telemetry.snapshot()}
+    assert series["career-insights"]["calls"] == 1
+    assert series["career-insights"]["cache"] == {"batched": 1}
+    assert series["career-insights-batch"]["upstreamCalls"] == 1
+
+
+# Test the local match score
+def test_match_score(client):
+    """
+    Tests that the local score weighs core skills higher and is served without Gemini
+
+    :param client: mongodb client
+    """
+    insights = {"technicalSkills": [
+        {"category": "Core", "tools": ["Python", "Machine Learning", "AWS Lambda"]},
+        {"category": "Extra", "tools": ["Docker", "C++"]},
+    ]}
+    resume = {"skills": ["python", "C++"], "experience": ["Built machine learning models"]}
+
+    rv = client.post("/match-score", json={"resume": resume, "jobInsights": insights})
+    assert rv.status_code == 200
+    result = json.loads(rv.data)
+    assert result["matchingSkills"] == ["Python", "Machine Learning", "C++"]
+    assert result["missingSkills"] == ["AWS Lambda", "Docker"]
+    assert 50 < result["overallMatch"] < 100
+
+    assert local_match.score({"skills": ["Cooking"]}, insights)["overallMatch"] == 0
+    assert local_match.score(resume, {})["overallMatch"] == 0
+    assert client.post("/match-score", json={"resume": resume}).status_code == 400
+
+
+# Test the local resume parser
+def test_parse_resume_locally(client, mocker):
+    """
+    Tests that a cleanly formatted resume is parsed without Gemini and a messy one still goes to Gemini
+
+    :param client: mongodb client
+    :param mocker: pytest mocker
+    """
+    text = "\n".join([
+        "Jane Doe",
+        "jane@example.com | (919) 555-1234",
+        "Technical Skills:",
+        "Languages: Python, Java, SQL",
+        "Tools: Docker • Git",
+        "Experience",
+        "Software Engineer, Acme Corp   Jan 2020 - Present",
+        "• Built services",
+        "Education",
+        "BS Computer Science, NC State University",
+        "Certifications",
+        "AWS Certified Developer",
+    ])
+    parsed, confidence = resume_parser.parse(text)
+    assert confidence == 1.0
+    assert parsed == {
+        "skills": ["Python", "Java", "SQL", "Docker", "Git"],
+        "experience": ["Software Engineer, Acme Corp Jan 2020 - Present"],
+        "education": ["BS Computer Science, NC State University"],
+        "certifications": ["AWS Certified Developer"],
+    }
+    assert resume_parser.parse("Jane Doe\nI like computers")[1] < resume_parser.DEFAULT_MIN_CONFIDENCE
+
+    mock_genai = MagicMock()
+    mocker.patch("llm_client.genai", mock_genai)
+    mock_page = MagicMock()
+    mock_page.extract_text.return_value = text
+    mocker.patch("app.PdfReader", return_value=MagicMock(pages=[mock_page]))
+
+    rv = client.post("/parse-resume", content_type="multipart/form-data",
+                     data={"resume": (BytesIO(b"%PDF"), "resume.pdf")})
+    assert rv.status_code == 200
+    assert json.loads(rv.data)["skills"] == ["Python", "Java", "SQL", "Docker", "Git"]
+    mock_genai.GenerativeModel.return_value.generate_content.assert_not_called()
+
+
+# Test the paginated analyses list and loading a full analysis
+def test_analyses_pagination(client, user):
+    """
+    Tests that /analyses pages through compressed analyses summaries and /analyses/<id> returns the full body
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Analyses.objects(userId=user_obj.id).delete()
+    for i in range(3):
+        analysis = {
+            "id": 1000 + i,
+            "searchTerm": f"Role {i}",
+            "date": f"01/0{i + 1}/2025, 10:00:00",
+            "comparison": {"overallMatch": 60 + i, "matchingSkills": ["Python"]},
+            "insights": {"roleOverview": "x" * 2000},
+        }
+        assert client.post("/analyses", headers=header, data=json.dumps(analysis)).status_code == 200
+
+    stored = Analyses.objects(userId=user_obj.id, analysisId=1000).first()
+    assert len(stored.body) < 2000
+
+    rv = client.get("/analyses?page=1&limit=2", headers=header)
+    assert rv.status_code == 200
+    assert rv.headers["X-Total-Count"] == "3"
+    page = json.loads(rv.data)
+    assert [a["id"] for a in page] == [1002, 1001]
+    assert page[0] == {"id": 1002, "searchTerm": "Role 2", "date": "01/03/2025, 10:00:00",
+                       "comparison": {"overallMatch": 62}}
+    assert [a["id"] for a in json.loads(client.get("/analyses?page=2&limit=2", headers=header).data)] == [1000]
+
+    rv = client.get("/analyses/1001", headers=header)
+    assert rv.status_code == 200
+    full = json.loads(rv.data)
+    assert full["insights"]["roleOverview"] == "x" * 2000
+    assert full["comparison"]["matchingSkills"] == ["Python"]
+    assert client.get("/analyses/999", headers=header).status_code == 404
+    assert client.get("/analyses?page=x", headers=header).status_code == 400
+
+    # analyses saved later (e.g. migrated) keep their place by creation time
+    old = {"id": int(datetime.datetime(2024, 5, 1).timestamp() * 1000), "searchTerm": "Old role"}
+    client.post("/analyses", headers=header, data=json.dumps(old))
+    assert [a["id"] for a in json.loads(client.get("/analyses", headers=header).data)] == [1002, 1001, 1000, old["id"]]
+
+    # re-posted and malformed ids are refused, analyses without an id get distinct ones
+    assert client.post("/analyses", headers=header, data=json.dumps({"id": 1000})).status_code == 409
+    assert client.post("/analyses", headers=header, data=json.dumps({"id": "latest"})).status_code == 400
+    assert client.post("/analyses", headers=header, data=json.dumps(["not", "an", "object"])).status_code == 400
+    same_time = {"searchTerm": "Twice", "date": "02/01/2025, 10:00:00"}
+    for _ in range(2):
+        assert client.post("/analyses", headers=header, data=json.dumps(same_time)).status_code == 200
+    assert len({a.analysisId for a in Analyses.objects(userId=user_obj.id, searchTerm="Twice")}) == 2
+
+
+# Test that identical analysis insights are stored once
+def test_analyses_share_identical_insights(client, user):
+    """
+    Tests that analyses with the same insights reference one shared part
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Analyses.objects(userId=user_obj.id).delete()
+    insights = {"roleOverview": "Shared overview", "softSkills": ["Communication"]}
+    for i, match in enumerate([40, 80]):
+        analysis = {"id": 2000 + i, "searchTerm": "Data Engineer", "comparison": {"overallMatch": match},
+                    # same content, different key order
+                    "insights": dict(reversed(list(insights.items()))) if i else insights}
+        assert client.post("/analyses", headers=header, data=json.dumps(analysis)).status_code == 200
+
+    first, second = Analyses.objects(userId=user_obj.id).order_by("analysisId")
+    assert first.parts["insights"] == second.parts["insights"]
+    assert AnalysisParts.objects(digest=first.parts["insights"]).count() == 1
+
+    full = json.loads(client.get("/analyses/2001", headers=header).data)
+    assert full["insights"] == insights
+    assert full["comparison"] == {"overallMatch": 80}
+
+    # unreferenced parts are collected; the cutoff only reaches parts this test backdated
+    orphan = store_analysis_part({"roleOverview": "Nobody refers to this"})
+    old = datetime.datetime(2000, 1, 1)
+    AnalysisParts.objects(digest__in=[orphan, first.parts["insights"]]).update(set__createdAt=old)
+    assert collect_analysis_parts(datetime.datetime.now() - datetime.datetime(2000, 1, 2)) == 1
+    assert AnalysisParts.objects(digest=orphan).count() == 0
+    assert AnalysisParts.objects(digest=first.parts["insights"]).count() == 1
+
+
+# Test that profile updates only write whitelisted fields
+def test_update_profile_partial(client, user):
+    """
+    Tests that /updateProfile sets only the known profile fields and returns the profile
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Users.objects(id=user_obj.id).update_one(set__applications=[{"id": 1, "companyName": "Acme"}],
+                                             set__skills=["Java"], unset__applicationStats=True)
+
+    rv = client.post("/updateProfile", headers=header,
+                     json={"skills": ["Java"], "locations": ["Raleigh"], "id": 99, "password": "x"})
+    assert rv.status_code == 200
+    result = json.loads(rv.data)
+    assert result["locations"] == ["Raleigh"]
+    assert result["skills"] == ["Java"]
+    assert "password" not in result and "applications" not in result
+
+    stored = Users.objects(id=user_obj.id).first()
+    assert stored.locations == ["Raleigh"]
+    assert stored.password != "x"
+    assert stored.applications == [{"id": 1, "companyName": "Acme"}]
+
+    assert client.post("/updateProfile", headers=header, json={"skills": "Java"}).status_code == 400
+    rv = client.get("/getProfile", headers=header)
+    assert json.loads(rv.data)["locations"] == ["Raleigh"]
+
+
+# Test the combined dashboard endpoint
+def test_dashboard(client, user):
+    """
+    Tests that /dashboard returns the profile, status counts and the latest applications and analyses
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Analyses.objects(userId=user_obj.id).delete()
+    applications = [
+        {"id": i, "jobTitle": f"Job {i}", "companyName": "Acme", "status": str(i % 3 + 1)} for i in range(1, 9)
+    ]
+    Users.objects(id=user_obj.id).update_one(set__applications=applications, set__skills=["Python"],
+                                             unset__applicationStats=True)
+    for i in range(7):
+        analysis = {"id": 3000 + i, "searchTerm": f"Role {i}", "comparison": {"overallMatch": 50},
+                    "insights": {"roleOverview": "Overview"}}
+        client.post("/analyses", headers=header, data=json.dumps(analysis))
+
+    rv = client.get("/dashboard", headers=header)
+    assert rv.status_code == 200
+    result = json.loads(rv.data)
+    assert result["profile"]["skills"] == ["Python"]
+    assert result["applicationCount"] == 8
+    assert result["applicationsByStatus"] == {"1": 2, "2": 3, "3": 3}
+    assert [a["id"] for a in result["recentApplications"]] == [8, 7, 6, 5, 4]
+    assert result["analysisCount"] == 7
+    assert [a["id"] for a in result["recentAnalyses"]] == [3006, 3005, 3004, 3003, 3002]
+    assert "insights" not in result["recentAnalyses"][0]
+
+    assert client.get("/dashboard").status_code == 401
+
+
+# Test the per-user application counters
+def test_application_stats(client, user):
+    """
+    Tests that adding, updating and deleting applications keeps the counters in step
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Users.objects(id=user_obj.id).update_one(set__applications=[], unset__applicationStats=True)
+
+    for company, date, status in [("Amazon.com", "2025-02-10", "1"), ("Acme", "2025-02-12", "1"),
+                                  ("Acme", "2025-03-03", "2")]:
+        application = {"jobTitle": "Engineer", "companyName": company, "date": date, "status": status}
+        assert client.post("/applications", headers=header, json={"application": application}).status_code == 200
+    applications = Users.objects(id=user_obj.id).first().applications
+
+    rv = client.put(f"/applications/{applications[0]['id']}", headers=header,
+                    json={"application": {"status": "3"}})
+    assert rv.status_code == 200
+    assert client.delete(f"/applications/{applications[1]['id']}", headers=header).status_code == 200
+
+    assert client.get("/applications/stats").status_code == 401  # protected as a path below /applications
+    rv = client.get("/applications/stats", headers=header)
+    assert rv.status_code == 200
+    stats = json.loads(rv.data)
+    assert stats == {
+        "total": 2,
+        "byStatus": {"2": 1, "3": 1},
+        "byCompany": {"Amazon.com": 1, "Acme": 1},
+        "byWeek": {"2025-W07": 1, "2025-W10": 1},
+    }
+    stored = Users.objects(id=user_obj.id).first()
+    assert [a["status"] for a in stored.applications] == ["3", "2"]
+
+    # counters that drifted are repaired by a rebuild
+    Users.objects(id=user_obj.id).update_one(inc__applicationStats__total=5)
+    assert json.loads(client.get("/applications/stats", headers=header).data)["total"] == 7
+    rebuild_application_stats(user_obj.id)
+    assert json.loads(client.get("/applications/stats", headers=header).data) == stats
+
+    # an edit that lands between the read and the update makes the update retry on the new values
+    application_id = applications[2]["id"]
+    calls = []
+
+    def change(application):
+        calls.append(application["status"])
+        if len(calls) == 1:
+            edited = dict(application, status="3")
+            update_applications(user_obj.id, {"$set": {"applications.$": edited}}, application, edited, application_id)
+        return {"$set": {"applications.$": dict(application, status="4")}}, dict(application, status="4")
+
+    change_application(user_obj.id, application_id, change)
+    assert calls == ["2", "3"]
+    assert json.loads(client.get("/applications/stats", headers=header).data)["byStatus"] == {"3": 1, "4": 1}
+
+
+# Test the cross-user analytics snapshots
+def test_analytics(client, user):
+    """
+    Tests that /analytics serves the materialized companies, funnel and searched roles
+
+    Only records owned by this test are added, and the counts are checked as
+    changes against a refresh taken before they were added.
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    suffix = uuid.uuid4().hex[:8]
+    acme, globex, role = f"Acme {suffix}", f"Globex {suffix}", f"Data Engineer {suffix}"
+    analysis_ids = [4000, 4001, 4002]
+    limit = 10000  # keep every company and role, so this test's ones are never cut off
+
+    def find(rows, key, value):
+        return next((row for row in rows if row[key].lower() == value.lower()), None)
+
+    try:
+        before = refresh_analytics(limit)
+        Users.objects(id=user_obj.id).update_one(set__applications=[
+            {"id": 1, "companyName": acme, "status": "1"},
+            {"id": 2, "companyName": acme.lower(), "status": "3"},
+            {"id": 3, "companyName": globex, "status": "4"},
+            {"id": 4, "companyName": acme, "status": "3"},
+        ], unset__applicationStats=True)
+        SharedJobs(id=f"acme-{suffix}", jobTitle="Engineer", companyName=acme, postedBy=user_obj.id).save()
+        SharedJobs(id=f"acme-upper-{suffix}", jobTitle="Designer", companyName=acme.upper(),
+                   postedBy=user_obj.id).save()
+        for analysis_id, term in zip(analysis_ids, [role, role.lower(), f"Designer {suffix}"]):
+            client.post("/analyses", headers=header, data=json.dumps({"id": analysis_id, "searchTerm": term}))
+        refresh_analytics(limit)
+
+        assert client.get("/analytics").status_code == 401
+        rv = client.get("/analytics", headers=header)
+        assert rv.status_code == 200
+        result = json.loads(rv.data)
+        assert find(result["topCompanies"], "company", acme) == {
+            "company": acme, "applications": 3, "applicants": 1, "openJobs": 2
+        }
+        assert find(result["topCompanies"], "company", globex)["applications"] == 1
+        assert find(result["topSearchedRoles"], "role", role) == {"role": role, "searches": 2, "users": 1}
+        funnel = result["statusFunnel"]
+        assert funnel["total"] - before["statusFunnel"]["total"] == 4
+        assert [
+            stage["applications"] - old["applications"]
+            for stage, old in zip(funnel["stages"], before["statusFunnel"]["stages"])
+        ] == [1, 0, 2, 1]
+        assert set(result["refresh"]) <= {"ok", "startedAt"}
+
+        # served from the snapshots until the next refresh
+        Users.objects(id=user_obj.id).update_one(set__applications=[], unset__applicationStats=True)
+        assert json.loads(client.get("/analytics", headers=header).data)["statusFunnel"]["total"] == funnel["total"]
+        refresh_analytics(limit)
+        assert json.loads(client.get("/analytics", headers=header).data)["statusFunnel"] == before["statusFunnel"]
+    finally:
+        Users.objects(id=user_obj.id).update_one(set__applications=[], unset__applicationStats=True)
+        SharedJobs.objects(id__in=[f"acme-{suffix}", f"acme-upper-{suffix}"]).delete()
+        Analyses.objects(userId=user_obj.id, analysisId__in=analysis_ids).delete()
+        refresh_analytics()
+
+    # the conversion rates of the funnel
+    funnel = analytics.funnel([{"_id": "1", "count": 1, "users": 1}, {"_id": "3", "count": 2, "users": 1},
+                               {"_id": "4", "count": 1, "users": 1}])
+    assert funnel["appliedRate"] == 0.75
+    assert funnel["rejectionRate"] == round(1 / 3, 4)
+
+    # without any snapshots the first read starts a refresh in the background instead of waiting for it
+    refreshed = threading.Event()
+    with patch("app.AnalyticsSnapshots.objects", return_value=[]), \
+            patch("app.refresh_analytics", side_effect=lambda limit: refreshed.set()):
+        rv = client.get("/analytics", headers=header)
+        assert rv.status_code == 503
+        assert rv.headers["Retry-After"] == "5"
+        assert refreshed.wait(5)
+
+    # a scheduled run is skipped while a triggered refresh is still running
+    release = threading.Event()
+    refresher = analytics.Refresher(lambda: release.wait(5))
+    assert refresher.trigger()
+    assert not refresher.trigger()
+    assert refresher.run_once() is None
+    release.set()
+    for _ in range(500):
+        if refresher.stats():
+            break
+        time.sleep(0.01)
+    assert refresher.stats()["ok"]
+    assert refresher.run_once()["ok"]
+
+
+# Test ETags and conditional GETs on the read endpoints
+def test_conditional_get(client, user):
+    """
+    Tests that unchanged data is answered with 304 and every change sends a new ETag
+
+    :param client: mongodb client
+    :param user: the test user object
+    """
+    user_obj, header = user
+    Users.objects(id=user_obj.id).update_one(set__applications=[], unset__applicationStats=True)
+    suffix = uuid.uuid4().hex[:8]
+    pool_job = f"pool-{suffix}"
+    application = {"jobTitle": "Engineer", "companyName": f"Globex {suffix}",
+                   "jobLink": f"https://globex.example/{suffix}"}
+
+    def etag_of(path):
+        rv = client.get(path, headers=header)
+        assert rv.status_code == 200
+        etag = rv.headers["ETag"]
+        assert client.get(path, headers=dict(header, **{"If-None-Match": etag})).status_code == 304
+        return etag
+
+    try:
+        SharedJobs(id=pool_job, jobTitle="Engineer", companyName=f"Acme {suffix}",
+                   jobLink=f"https://acme.example/{suffix}", postedBy=user_obj.id).save()
+        tags = {path: etag_of(path) for path in ["/applications", "/getProfile", "/analyses", "/jobs/shared"]}
+        assert etag_of("/analyses?page=2") != tags["/analyses"]
+
+        client.post("/applications", headers=header, json={"application": application})
+        assert etag_of("/applications") != tags["/applications"]
+        assert etag_of("/jobs/shared") != tags["/jobs/shared"]
+
+        client.post("/updateProfile", headers=header, json={"skills": ["Go"]})
+        assert etag_of("/getProfile") != tags["/getProfile"]
+
+        client.post("/analyses", headers=header, data=json.dumps({"id": 5000, "searchTerm": "Engineer"}))
+        rv = client.get("/analyses", headers=dict(header, **{"If-None-Match": tags["/analyses"]}))
+        assert rv.status_code == 200
+        assert json.loads(rv.data)[0]["id"] == 5000
+    finally:
+        SharedJobs.objects(id=pool_job).delete()
+        SharedJobs.objects(companyName=application["companyName"], jobLink=application["jobLink"]).delete()
+        Analyses.objects(userId=user_obj.id, analysisId=5000).delete()
@@ -0,0 +1,146 @@
+"""
+Background warm-up of the career insights cache
+
+The most common job titles (from the shared job pool and the users'
+applications) are generated ahead of demand and refreshed before they go
+stale, so most /fake-job searches hit a warm entry. Each run spends at most
+a fixed number of LLM calls and stops early when Gemini pushes back. With a
+shared limiter, that budget holds for all worker processes on the host
+together instead of for each of them.
+"""
+import threading
+import time
+from collections import Counter
+
+import llm_cache
+
+
+def top_titles(counts, limit):
+    """
+    Merges job title counts from several sources into the top titles
+
+    Titles are compared case and whitespace insensitively; the most common
+    spelling of each title is returned.
+
+    :param counts: iterable of (title, count) pairs
+    :param limit: number of titles to return
+    :return: list of titles, most common first
+    """
+    totals = Counter()
+    spellings = {}
+    for title, count in counts:
+        if not isinstance(title, str) or not title.strip():
+            continue
+        key = llm_cache.normalize_key(title)
+        totals[key] += count
+        spellings.setdefault(key, Counter())[" ".join(title.split())] += count
+    return [spellings[key].most_common(1)[0][0] for key, _ in totals.most_common(limit)]
+
+
+class InsightsWarmer:
+    """
+    Periodically fills a TTLCache with the insights of the popular job titles
+    """
+
+    def __init__(self, cache, key, compute, titles, interval=3600, budget=20, refresh_margin=None,
+                 stop_errors=(), limiter=None):
+        """
+        :param cache: TTLCache to fill
+        :param key: callable mapping a title to its cache key
+        :param compute: callable generating the insights of a title
+        :param titles: zero-argument callable returning the titles to keep warm, most important first
+        :param interval: seconds between runs
+        :param budget: maximum LLM calls per run
+        :param refresh_margin: refresh entries that go stale within this many seconds,
+            defaults to the interval so nothing expires between two runs
+        :param stop_errors: errors (rate limits, outages) that end a run early
+        :param limiter: optional RateLimiter shared by the worker processes; every
+            call takes one of its tokens and a run ends once none is left
+        """
+        self.cache = cache
+        self.key = key
+        self.compute = compute
+        self.titles = titles
+        self.interval = interval
+        self.budget = budget
+        self.refresh_margin = interval if refresh_margin is None else refresh_margin
+        self.stop_errors = stop_errors
+        self.limiter = limiter
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.last_run = {}
+
+    def run_once(self):
+        """
+        Generates the missing or soon stale insights of the top titles, within the budget
+
+        :return: JSON object with the number of titles warmed, skipped and failed
+        """
+        started = time.time()
+        warmed = skipped = failed = 0
+        calls = 0
+        for title in self.titles():
+            fresh_for = self.cache.fresh_for(self.key(title))
+            if fresh_for is not None and fresh_for > self.refresh_margin:
+                skipped += 1
+                continue
+            if calls >= self.budget:
+                break
+            lease = None
+            if self.limiter is not None:
+                lease, _ = self.limiter.try_acquire()
+                if lease is None:
+                    # the other worker processes already spent the budget of this interval
+                    break
+            calls += 1
+            try:
+                self.cache.set(self.key(title), self.compute(title))
+                warmed += 1
+            except self.stop_errors as e:
+                print(f"Stopping insights warm-up: {str(e)}")
+                failed += 1
+                break
+            except Exception as e:
+                print(f"Error warming insights for {title}: {str(e)}")
+                failed += 1
+            finally:
+                if lease is not None:
+                    self.limiter.release(lease)
+        result = {
+            "warmed": warmed,
+            "skipped": skipped,
+            "failed": failed,
+            "startedAt": started,
+            "seconds": round(time.time() - started, 3),
+        }
+        with self.lock:
+            self.last_run = result
+        return result
+
+    def start(self):
+        """
+        Runs the warm-up now and then every interval seconds in a daemon thread
+        """
+        def loop():
+            while not self.stopped.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Error in insights warm-up: {str(e)}")
+                self.stopped.wait(self.interval)
+
+        self.thread = threading.Thread(target=loop, name="insights-warmup", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        """
+        Returns the outcome of the last run
+
+        :return: JSON object
+        """
+        with self.lock:
+            return dict(self.last_run)
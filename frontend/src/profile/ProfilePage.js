@@ -13,6 +13,8 @@ import {
 	faPhone
 } from '@fortawesome/free-solid-svg-icons';
 
+const ANALYSES_PAGE_SIZE = 20;
+
 const ProfilePage = (props) => {
 	const [locationModalOpen, setLocationModalOpen] = useState(false);
 	const [skillsModalOpen, setSkillsModalOpen] = useState(false);
@@ -21,6 +23,7 @@ const ProfilePage = (props) => {
 	const [jobModeModalOpen, setJobModeModalOpen] = useState(false);
 	const [pastAnalyses, setPastAnalyses] = useState([]);
 	const [selectedAnalysis, setSelectedAnalysis] = useState(null);
+	const [analysesTotal, setAnalysesTotal] = useState(0);
 	const [applicationCount, setApplicationCount] = useState(0);
 	const [applicationsByStatus, setApplicationsByStatus] = useState({
 		applied: 0,
@@ -51,51 +54,70 @@ const ProfilePage = (props) => {
 		);
 	}
 
-	useEffect(() => {
-		// Fetch past analyses from backend
-		const fetchAnalyses = async () => {
-			try {
-				const response = await fetch('http://127.0.0.1:5000/analyses', {
-					headers: {
-						'Authorization': 'Bearer ' + localStorage.getItem('token'),
-						'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
-						'Access-Control-Allow-Credentials': 'true'
-					}
-				});
-				
-				if (!response.ok) {
-					throw new Error('Failed to fetch analyses');
-				}
-				
-				const data = await response.json();
-				setPastAnalyses(data);
-			} catch (error) {
-				console.error('Error fetching analyses:', error);
+	const authHeaders = {
+		'Authorization': 'Bearer ' + localStorage.getItem('token'),
+		'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
+		'Access-Control-Allow-Credentials': 'true'
+	};
+
+	// Fetch a page of past analyses (summaries only) from backend
+	const fetchAnalyses = async (page = 1) => {
+		try {
+			const response = await fetch(`http://127.0.0.1:5000/analyses?page=${page}&limit=${ANALYSES_PAGE_SIZE}`, {
+				headers: authHeaders
+			});
+			
+			if (!response.ok) {
+				throw new Error('Failed to fetch analyses');
 			}
-		};
+			
+			const data = await response.json();
+			setAnalysesTotal(Number(response.headers.get('X-Total-Count')) || data.length);
+			setPastAnalyses(previous => page === 1 ? data : [...previous, ...data]);
+		} catch (error) {
+			console.error('Error fetching analyses:', error);
+		}
+	};
 
-		// Fetch applications and analyses
-		Promise.all([
-			fetch('http://127.0.0.1:5000/applications', {
-				headers: {
-					'Authorization': 'Bearer ' + localStorage.getItem('token'),
-					'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
-					'Access-Control-Allow-Credentials': 'true'
-				}
-			}),
-			fetchAnalyses()
-		])
-		.then(async ([applicationsResponse]) => {
-			const applicationsData = await applicationsResponse.json();
-			setApplicationCount(applicationsData.length);
-			// Count applications by status
-			const counts = {
-				applied: applicationsData.filter(app => app.status === '3').length,
-				rejected: applicationsData.filter(app => app.status === '4').length,
-				waitingReferral: applicationsData.filter(app => app.status === '2').length,
-				wishList: applicationsData.filter(app => app.status === '1').length
-			};
-			setApplicationsByStatus(counts);
+	// The list only has summaries, so load the whole analysis when one is opened
+	const selectAnalysis = async (analysis) => {
+		if (selectedAnalysis?.id === analysis.id) {
+			setSelectedAnalysis(null);
+			return;
+		}
+		try {
+			const response = await fetch(`http://127.0.0.1:5000/analyses/${analysis.id}`, {
+				headers: authHeaders
+			});
+			if (!response.ok) {
+				throw new Error('Failed to fetch analysis');
+			}
+			setSelectedAnalysis(await response.json());
+		} catch (error) {
+			console.error('Error fetching analysis:', error);
+		}
+	};
+
+	useEffect(() => {
+		// Fetch the application counts and latest analyses in one request
+		fetch('http://127.0.0.1:5000/dashboard', {
+			headers: authHeaders
+		})
+		.then(async (response) => {
+			if (!response.ok) {
+				throw new Error('Failed to fetch dashboard');
+			}
+			const data = await response.json();
+			const counts = data.applicationsByStatus;
+			setApplicationCount(data.applicationCount);
+			setApplicationsByStatus({
+				applied: counts['3'] || 0,
+				rejected: counts['4'] || 0,
+				waitingReferral: counts['2'] || 0,
+				wishList: counts['1'] || 0
+			});
+			setPastAnalyses(data.recentAnalyses);
+			setAnalysesTotal(data.analysisCount);
 		})
 		.catch(error => {
 			console.error('Error fetching data:', error);
@@ -439,9 +461,7 @@ const ProfilePage = (props) => {
 										className={`list-group-item list-group-item-action p-3 mb-2 ${
 											selectedAnalysis?.id === analysis.id ? 'active' : ''
 										}`}
-										onClick={() => setSelectedAnalysis(
-											selectedAnalysis?.id === analysis.id ? null : analysis
-										)}
+										onClick={() => selectAnalysis(analysis)}
 										style={{
 											borderRadius: '8px',
 											border: '1px solid #dee2e6'
@@ -462,6 +482,17 @@ const ProfilePage = (props) => {
 								))}
 							</div>
 
+							{pastAnalyses.length < analysesTotal && (
+								<div className="text-center">
+									<button
+										className="btn btn-outline-secondary btn-sm"
+										onClick={() => fetchAnalyses(Math.floor(pastAnalyses.length / ANALYSES_PAGE_SIZE) + 1)}
+									>
+										Load more
+									</button>
+								</div>
+							)}
+
 							{pastAnalyses.length === 0 && (
 								<div className="text-center mt-4">
 									<p className="text-muted">No analyses yet</p>
@@ -1,7 +1,6 @@
 import React, { Component } from 'react';
 import axios from 'axios';
 // ... existing imports ...
-import $ from 'jquery';
 
 class SearchPage extends Component {
     state = {
@@ -24,111 +23,41 @@ class SearchPage extends Component {
         }
     }
 
-    fetchResume = async () => {
-        try {
-            const response = await $.ajax({
-                url: 'http://127.0.0.1:5000/resume',
-                method: 'GET',
-                headers: {
-                    'Authorization': 'Bearer ' + localStorage.getItem('token'),
-                    'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
-                    'Access-Control-Allow-Credentials': 'true'
-                },
-                xhrFields: {
-                    responseType: 'blob'
-                }
-            });
-
-            const formData = new FormData();
-            formData.append('resume', response);
-
-            const parseResponse = await axios.post('http://127.0.0.1:5000/parse-resume', formData, {
-                headers: {
-                    'Authorization': `Bearer ${localStorage.getItem('token')}`,
-                    'Content-Type': 'multipart/form-data'
-                }
-            });
-
-            return parseResponse.data;
-        } catch (error) {
-            console.error('Error fetching/parsing resume:', error);
-            return null;
-        }
-    };
-
     handleSearch = async () => {
         if (!this.state.searchText) return;
         this.setState({ loading: true, error: null });
 
         try {
-            const [resumeContent, insightsResponse] = await Promise.all([
-                this.fetchResume(),
-                axios.get('http://127.0.0.1:5000/fake-job', {
-                    params: { keywords: this.state.searchText },
-                    headers: {
-                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
-                        'Content-Type': 'application/json'
-                    }
-                })
-            ]);
-
-            if (resumeContent && insightsResponse.data) {
-                const comparisonResponse = await axios.post('http://127.0.0.1:5000/compare-resume', {
-                    resume: resumeContent,
-                    jobInsights: insightsResponse.data
-                }, {
-                    headers: {
-                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
-                        'Content-Type': 'application/json'
-                    }
-                });
-
-                const newAnalysis = {
-                    id: Date.now(),
-                    searchTerm: this.state.searchText,
-                    date: new Date().toLocaleString(),
-                    comparison: comparisonResponse.data,
-                    insights: insightsResponse.data
-                };
-
-                // Save analysis to backend
-                try {
-                    const response = await fetch('http://127.0.0.1:5000/analyses', {
-                        method: 'POST',
-                        headers: {
-                            'Authorization': 'Bearer ' + localStorage.getItem('token'),
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
-                            'Access-Control-Allow-Credentials': 'true'
-                        },
-                        body: JSON.stringify(newAnalysis)
-                    });
-                    
-                    if (!response.ok) {
-                        throw new Error('Failed to save analysis');
-                    }
-
-                    // Fetch updated analyses list
-                    this.fetchAnalyses();
-                } catch (error) {
-                    console.error('Error saving analysis:', error);
+            // The backend parses the stored resume, builds the insights, compares them
+            // and saves the analysis in a single round trip
+            const response = await axios.get('http://127.0.0.1:5000/analyze', {
+                params: { keywords: this.state.searchText },
+                headers: {
+                    'Authorization': `Bearer ${localStorage.getItem('token')}`,
+                    'Content-Type': 'application/json'
                 }
+            });
+            const { resume, insights, comparison, analysis } = response.data;
+
+            if (analysis) {
+                // Fetch updated analyses list
+                this.fetchAnalyses();
 
-                const updatedAnalyses = [...this.state.pastAnalyses, newAnalysis];
+                const updatedAnalyses = [...this.state.pastAnalyses, analysis];
                 localStorage.setItem('pastAnalyses', JSON.stringify(updatedAnalyses));
                 this.setState({
-                    insights: insightsResponse.data,
-                    resumeContent,
-                    comparison: comparisonResponse.data,
+                    insights,
+                    resumeContent: resume,
+                    comparison,
                     loading: false,
                     selectedAnalysis: null,
                     pastAnalyses: updatedAnalyses
                 });
             } else {
                 this.setState({
-                    insights: insightsResponse.data,
+                    insights,
                     loading: false,
-                    error: resumeContent ? null : 'No resume found. Please upload a resume first.'
+                    error: 'No resume found. Please upload a resume first.'
                 });
             }
         } catch (error) {
@@ -140,7 +69,26 @@ class SearchPage extends Component {
         }
     };
 
-    handleAnalysisSelect = (analysis) => {
+    handleAnalysisSelect = async (analysis) => {
+        // The list only holds summaries, so load the full analysis first
+        if (!analysis.insights) {
+            try {
+                const response = await fetch(`http://127.0.0.1:5000/analyses/${analysis.id}`, {
+                    headers: {
+                        'Authorization': 'Bearer ' + localStorage.getItem('token'),
+                        'Access-Control-Allow-Origin': 'http://127.0.0.1:3000',
+                        'Access-Control-Allow-Credentials': 'true'
+                    }
+                });
+                if (!response.ok) {
+                    throw new Error('Failed to fetch analysis');
+                }
+                analysis = await response.json();
+            } catch (error) {
+                console.error('Error fetching analysis:', error);
+                return;
+            }
+        }
         this.setState({
             selectedAnalysis: analysis,
             insights: analysis.insights,